@@ -0,0 +1,148 @@
+import argparse
+import json
+import os
+import sys
+
+from profiler import NULL_PROFILER, AllocationProfiler
+from render_check import make_app, framebuffer_target, pyxel_target
+
+# ウィンドウなしで Game.update と App.draw を回し、区間ごとに Python のメモリ確保を
+# profiler.AllocationProfiler で数えて表にする。予算つきのシナリオ（rally: ボール1個のラリー）では、
+# ラリーが続いているだけのフレーム（ブロックを壊さず、演出も残っていない）について
+#   objects  どのフレームのどの区間でも 0（GC が走るのはこれが積もったときなので、0 ならラリー中に
+#            GC の停止は起きない）
+#   bytes    区間ごとの中央値が予算ファイルの値以下（for 文の反復子のように、その場で解放される
+#            確保は Python では避けられないので、その分だけを予算にしておく。予算にない区間は 0）
+# でなければ失敗にする。予算は Python のバージョンで変わるので、違う環境では --update-budget で取り直す。
+BUDGET_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alloc_budget.json")
+WARMUP = 120  # 計測の前に回すフレーム数（プールの確保など最初の1回だけの処理を除くため）
+# 描画先の中の処理（pyxel や Framebuffer の中の確保）は予算に入れない
+BACKEND_PHASES = ('draw_submit',)
+
+
+def is_quiet(game):
+    # ラリーが続いているだけの状態か（壊したブロックも、残っている演出もない）
+    return (not game.events.count and not game.particles.count and not game.explosion_effects.count and
+            not game.game_over and not game.game_cleared)
+
+
+# (名前, benchmarks.py のシナリオ, フレーム数, 予算を見るか)
+SCENARIOS = [
+    ('rally', 'steady', 3000, True),
+    ('play', 'play', 3000, False),
+    ('combo', 'combo', 300, False),
+]
+
+
+def run(gfx, scenario, frames, seed=0):
+    # シナリオを WARMUP フレーム回してから frames フレーム計測し、(プロファイラ, ラリーだけの
+    # フレームの {区間名: bytes の list}, そのフレームで GC 対象のオブジェクトが増えたときのメッセージ) を返す。
+    # プロファイラと集計用の list は WARMUP の間に作っておく（作った直後は空きリストの補充で確保が
+    # 出るので、WARMUP の間のフレームは window から押し出し、数えもしない）。フレームごとの dict や
+    # tuple をためると空きリストが減って計測が変わるので、ためるのは int だけにしてオブジェクトは
+    # その場で調べる
+    app, step = make_app(gfx, scenario, seed)
+    game = app.game
+    profiler = AllocationProfiler(window=frames)
+    game.profiler = profiler
+    quiet_bytes = {}
+    failures = []
+    try:
+        for frame in range(-WARMUP, frames):
+            if frame == 0:
+                for samples in quiet_bytes.values():
+                    samples.clear()
+            buttons = step(game)
+            quiet = is_quiet(game)
+            profiler.start()
+            game.update(buttons)
+            app.draw()
+            if quiet and is_quiet(game):
+                for phase, (size, kept, objects) in profiler.last_frame.items():
+                    samples = quiet_bytes.get(phase)
+                    if samples is None:
+                        samples = quiet_bytes[phase] = []
+                    samples.append(size)
+                    if objects > 0 and frame >= 0 and phase not in BACKEND_PHASES:
+                        failures.append(f"frame {frame}: {phase} left {objects} objects for the GC")
+    finally:
+        game.profiler = NULL_PROFILER
+        profiler.close()
+    return profiler, quiet_bytes, failures
+
+
+def median_bytes(quiet_bytes):
+    # 区間ごとの bytes の中央値（描画先の区間は除く）
+    medians = {}
+    for phase, samples in quiet_bytes.items():
+        if phase not in BACKEND_PHASES:
+            medians[phase] = sorted(samples)[len(samples) // 2]
+    return medians
+
+
+def compare(medians, budget):
+    failures = []
+    for phase, size in sorted(medians.items()):
+        if size > budget.get(phase, 0):
+            failures.append(f"{phase} allocates {size}B per frame > budget {budget.get(phase, 0)}B")
+    return failures
+
+
+def format_rows(profiler):
+    lines = [f"  {'phase':<14}{'bytes':>9}{'max':>8}{'alloc%':>8}{'kept':>8}{'objects':>9}  (per frame)"]
+    for phase, size, peak, ratio, kept, objects in profiler.summary():
+        lines.append(f"  {phase:<14}{size:9.1f}{peak:8d}{ratio * 100:7.0f}%{kept:8.1f}{objects:9.2f}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-frame allocation report and rally allocation budget")
+    parser.add_argument('scenarios', nargs='*', help="scenarios to run (default: all)")
+    parser.add_argument('--budget', default=BUDGET_FILE)
+    parser.add_argument('--update-budget', action='store_true',
+                        help="store the rally's per-phase allocations as the new budget")
+    parser.add_argument('--frames-scale', type=float, default=1.0,
+                        help="multiply every scenario's frame count")
+    parser.add_argument('--pyxel', action='store_true',
+                        help="draw with pyxel instead of the framebuffer")
+    args = parser.parse_args(argv)
+
+    selected = [s for s in SCENARIOS if not args.scenarios or s[0] in args.scenarios]
+    budgets = {}
+    if os.path.exists(args.budget):
+        with open(args.budget) as f:
+            budgets = json.load(f)
+
+    failures = []
+    for name, scenario, frames, budgeted in selected:
+        gfx, _ = pyxel_target() if args.pyxel else framebuffer_target()
+        profiler, quiet_bytes, over = run(gfx, scenario, max(1, int(frames * args.frames_scale)))
+        quiet_frames = len(quiet_bytes.get('paddle', ()))
+        print(f"{name}: {len(profiler.history.get('frame', ()))} frames, {quiet_frames} rally-only")
+        print(format_rows(profiler))
+        if not budgeted:
+            continue
+        medians = median_bytes(quiet_bytes)
+        if args.update_budget:
+            budgets[name] = medians
+            continue
+        failures += [f"{name} {failure}" for failure in over]
+        failures += [f"{name}: {failure}" for failure in compare(medians, budgets.get(name, {}))]
+
+    if args.update_budget:
+        with open(args.budget, 'w') as f:
+            json.dump(budgets, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"budget written to {args.budget}")
+        return 0
+
+    if failures:
+        print(f"\nALLOCATION BUDGET EXCEEDED ({len(failures)}):")
+        for failure in failures[:20]:
+            print("  " + failure)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
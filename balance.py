@@ -0,0 +1,242 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import struct
+import sys
+import time
+from array import array
+
+from game_core import Game, FPS, BTN_LEFT, BTN_RIGHT, follow_ball_input
+
+# 結果ファイルの形式（リトルエンディアン、列ごとに並べたチャンクの連続）:
+#   ヘッダ    "BRKB" + version(u8) + JSON の長さ(u32) + JSON（列の名前と型、設定の一覧）
+#   チャンク  行数(u32) + 列ごとに 行数 個の値をまとめたもの（COLUMNS の順）
+# 1ゲーム = 1行。ゲームが終わった順にチャンク単位で書き足していく。
+MAGIC = b"BRKB"
+VERSION = 1
+HEADER = struct.Struct("<4sBI")
+CHUNK = struct.Struct("<I")
+
+# (列名, array の型)
+COLUMNS = (
+    ('config', 'H'),  # 設定の番号（ヘッダの configs の添字）
+    ('seed', 'I'),
+    ('cleared', 'B'),
+    ('game_over', 'B'),
+    ('frames', 'I'),
+    ('clear_time', 'f'),
+    ('bonus_time', 'f'),
+    ('ball_bonus', 'f'),
+    ('combo_bonus', 'f'),
+    ('max_combo', 'H'),
+    ('max_balls', 'H'),
+    ('end_balls', 'H'),
+)
+
+GAMES_PER_TASK = 100
+MAX_FRAMES = 600 * FPS  # これだけ経っても終わらないゲームは打ち切る
+
+
+# --- 方策 -------------------------------------------------------------------
+
+def late_policy(game):
+    # ボールが下りてきて画面の下半分に入ってから追いかける（人間の遅れた反応の代わり）
+    target = None
+    lowest = -1
+    for ball in game.balls:
+        if ball.dy > 0 and ball.y > game.height / 2 and ball.y > lowest:
+            lowest = ball.y
+            target = ball.x + ball.size / 2
+    if target is None:
+        return 0
+    center = game.paddle_x + game.paddle_width / 2
+    if target < center - 4:
+        return BTN_LEFT
+    if target > center + 4:
+        return BTN_RIGHT
+    return 0
+
+
+POLICIES = {
+    'follow': follow_ball_input,
+    'late': late_policy,
+}
+
+
+# --- シミュレーション --------------------------------------------------------
+
+def play(game, config, seed, policy, max_frames):
+    # seed のゲームを最後まで（またはmax_frames まで）遊んで1行分の結果を返す
+    game.reseed(seed)
+    game.item_drop_rate = config['item_drop_rate']
+    game.max_combo_timer = config['max_combo_timer']
+    game.combo_bonus_per_combo = config['combo_bonus_per_combo']
+    game.ball_bonus_per_ball = config['ball_bonus_per_ball']
+    game.init_game()
+    update = game.update
+    max_balls = 1
+    frames = 0
+    while frames < max_frames and not game.game_cleared and not game.game_over:
+        update(policy(game))
+        frames += 1
+        if len(game.balls) > max_balls:
+            max_balls = len(game.balls)
+    return (seed, game.game_cleared, game.game_over, frames, game.clear_time, game.bonus_time,
+            game.ball_bonus, game.combo_bonus, game.max_combo, max_balls, len(game.balls))
+
+
+def run_task(task):
+    # ワーカーで GAMES_PER_TASK 個ほどのゲームを回し、列ごとの配列を bytes で返す
+    config_index, config, first_seed, count, policy_name, max_frames = task
+    policy = POLICIES[policy_name]
+    game = Game(effects=False)
+    columns = [array(typecode) for _, typecode in COLUMNS]
+    for seed in range(first_seed, first_seed + count):
+        row = (config_index,) + play(game, config, seed, policy, max_frames)
+        for column, value in zip(columns, row):
+            column.append(value)
+    return count, [column_bytes(column) for column in columns]
+
+
+def column_bytes(column):
+    if sys.byteorder != 'little':
+        column.byteswap()
+    return column.tobytes()
+
+
+def make_configs(args):
+    configs = []
+    for drop_rate, combo_timer, combo_bonus, ball_bonus in itertools.product(
+            args.drop_rate, args.combo_timer, args.combo_bonus, args.ball_bonus):
+        configs.append({
+            'item_drop_rate': drop_rate,
+            'max_combo_timer': combo_timer,
+            'combo_bonus_per_combo': combo_bonus,
+            'ball_bonus_per_ball': ball_bonus,
+        })
+    return configs
+
+
+def make_tasks(configs, games, first_seed, policy, max_frames):
+    # どの設定も同じ seed の列で遊ぶので、設定の違いだけを比べられる
+    for config_index, config in enumerate(configs):
+        for start in range(0, games, GAMES_PER_TASK):
+            count = min(GAMES_PER_TASK, games - start)
+            yield config_index, config, first_seed + start, count, policy, max_frames
+
+
+# --- 結果ファイル -----------------------------------------------------------
+
+def write_header(f, configs, meta):
+    header = json.dumps({'columns': COLUMNS, 'configs': configs, 'meta': meta}).encode()
+    f.write(HEADER.pack(MAGIC, VERSION, len(header)))
+    f.write(header)
+
+
+def write_chunk(f, rows, columns):
+    f.write(CHUNK.pack(rows))
+    for data in columns:
+        f.write(data)
+
+
+def read_results(path):
+    # (ヘッダの dict, {列名: array}) を返す
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version, header_size = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not a balance results file")
+    offset = HEADER.size
+    header = json.loads(data[offset:offset + header_size])
+    offset += header_size
+    columns = {name: array(typecode) for name, typecode in header['columns']}
+    while offset < len(data):
+        (rows,) = CHUNK.unpack_from(data, offset)
+        offset += CHUNK.size
+        for name, typecode in header['columns']:
+            column = columns[name]
+            size = rows * column.itemsize
+            chunk = array(typecode, data[offset:offset + size])
+            if sys.byteorder != 'little':
+                chunk.byteswap()
+            column.extend(chunk)
+            offset += size
+    return header, columns
+
+
+# --- 集計 -------------------------------------------------------------------
+
+def percentile(ordered, p):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def summarize(configs, columns):
+    # 設定ごとの分布の要約を表にした文字列を返す
+    by_config = [[] for _ in configs]
+    for row, config_index in enumerate(columns['config']):
+        by_config[config_index].append(row)
+    lines = [f"{'drop':>6}{'combo':>6}{'c.bonus':>8}{'b.bonus':>8}{'games':>8}{'clear%':>8}{'over%':>7}"
+             f"{'time p10/50/90':>22}{'bonus avg':>10}{'combo p50/90':>13}{'balls avg/max':>14}"]
+    for config, rows in zip(configs, by_config):
+        if not rows:
+            continue
+        cleared = [row for row in rows if columns['cleared'][row]]
+        games = len(rows)
+        over = sum(columns['game_over'][row] for row in rows)
+        times = sorted(columns['clear_time'][row] for row in cleared)
+        bonus = sum(columns['bonus_time'][row] for row in cleared) / len(cleared) if cleared else 0
+        combos = sorted(columns['max_combo'][row] for row in rows)
+        balls = [columns['max_balls'][row] for row in rows]
+        lines.append(
+            f"{config['item_drop_rate']:6.3f}{config['max_combo_timer']:6d}"
+            f"{config['combo_bonus_per_combo']:8.2f}{config['ball_bonus_per_ball']:8.2f}"
+            f"{games:8d}{100 * len(cleared) / games:8.1f}{100 * over / games:7.1f}"
+            f"{percentile(times, 10):8.1f}{percentile(times, 50):7.1f}{percentile(times, 90):7.1f}"
+            f"{bonus:10.2f}{percentile(combos, 50):6d}{percentile(combos, 90):7d}"
+            f"{sum(balls) / games:8.2f}{max(balls):6d}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monte Carlo balance analyzer for simple_game")
+    parser.add_argument('--games', type=int, default=1000, help="games per configuration")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the first game")
+    parser.add_argument('--drop-rate', type=float, nargs='+', default=[0.08])
+    parser.add_argument('--combo-timer', type=int, nargs='+', default=[30])
+    parser.add_argument('--combo-bonus', type=float, nargs='+', default=[0.1],
+                        help="seconds per combo step")
+    parser.add_argument('--ball-bonus', type=float, nargs='+', default=[1],
+                        help="seconds per extra ball at clear")
+    parser.add_argument('--policy', choices=sorted(POLICIES), default='follow')
+    parser.add_argument('--max-frames', type=int, default=MAX_FRAMES)
+    parser.add_argument('--workers', type=int, default=None, help="default: all cores")
+    parser.add_argument('--out', default='balance.brkb', help="columnar results file")
+    args = parser.parse_args(argv)
+
+    configs = make_configs(args)
+    tasks = make_tasks(configs, args.games, args.seed, args.policy, args.max_frames)
+    total = len(configs) * args.games
+    meta = {'policy': args.policy, 'max_frames': args.max_frames, 'first_seed': args.seed}
+
+    start = time.perf_counter()
+    done = 0
+    with open(args.out, 'wb') as f, multiprocessing.Pool(args.workers) as pool:
+        write_header(f, configs, meta)
+        for rows, columns in pool.imap_unordered(run_task, tasks):
+            write_chunk(f, rows, columns)
+            done += rows
+            print(f"\r{done}/{total} games, {done / (time.perf_counter() - start):.0f} games/s",
+                  end='', file=sys.stderr)
+    print(file=sys.stderr)
+
+    _, columns = read_results(args.out)
+    print(summarize(configs, columns))
+    print(f"results written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+import numpy as np
+
+from game_core import BALL_SPEED, BALL_SIZE
+from geometry import DEG_TO_RAD
+
+
+class BallStorm:
+    """ボールストームモードのボール置き場。全ボールを NumPy 配列で持ち、一括で動かす。
+
+    Game.balls の代わりに使う。移動・壁とパドルでの反射・画面外に出たボールの除去・
+    ブロックとの当たり判定を、ボールの数によらず配列演算数回で済ませる。
+    """
+
+    def __init__(self, capacity=256):
+        self.size = BALL_SIZE
+        self.count = 0
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.dx = np.zeros(capacity)
+        self.dy = np.zeros(capacity)
+        self.cells = None
+        self.cells_version = None
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.count = 0
+
+    def reserve(self, count):
+        capacity = len(self.x)
+        if count <= capacity:
+            return
+        while capacity < count:
+            capacity *= 2
+        for name in ('x', 'y', 'dx', 'dy'):
+            grown = np.zeros(capacity)
+            grown[:self.count] = getattr(self, name)[:self.count]
+            setattr(self, name, grown)
+
+    def add(self, x, y, rng, speed=BALL_SPEED, count=1):
+        # Ball と同じく -60..60 度のランダムな向きで打ち出す
+        start = self.count
+        end = start + count
+        self.reserve(end)
+        angles = np.array([rng.uniform(-60, 60) for _ in range(count)]) * DEG_TO_RAD
+        self.x[start:end] = x
+        self.y[start:end] = y
+        self.dx[start:end] = speed * np.sin(angles)
+        self.dy[start:end] = -speed * np.cos(angles)
+        self.count = end
+
+    def add_copies(self, rng, count):
+        # ランダムに選んだボールの位置から count 個のボールを打ち出す
+        if self.count == 0:
+            return
+        source = rng.randrange(self.count)
+        speed = float(np.hypot(self.dx[source], self.dy[source]))
+        self.add(float(self.x[source]), float(self.y[source]), rng, speed, count)
+
+    def lowest_center(self):
+        if self.count == 0:
+            return None
+        i = int(np.argmax(self.y[:self.count]))
+        return float(self.x[i]) + self.size / 2
+
+    def update(self, game):
+        n = self.count
+        size = self.size
+        x = self.x[:n]
+        y = self.y[:n]
+        dx = self.dx[:n]
+        dy = self.dy[:n]
+
+        x += dx
+        y += dy
+
+        hit_left = x < 0
+        x[hit_left] = 0
+        dx[hit_left] = np.abs(dx[hit_left])
+        hit_right = x > game.width - size
+        x[hit_right] = game.width - size
+        dx[hit_right] = -np.abs(dx[hit_right])
+        hit_top = y < 0
+        y[hit_top] = 0
+        dy[hit_top] = np.abs(dy[hit_top])
+
+        # Ball.update と同じ、当たった位置で角度が変わるパドル反射
+        on_paddle = np.flatnonzero((y + size > game.paddle_y) &
+                                   (x + size > game.paddle_x) &
+                                   (x < game.paddle_x + game.paddle_width))
+        if len(on_paddle):
+            half = game.paddle_width / 2
+            bounce = ((game.paddle_x + half) - x[on_paddle]) / half * 60 * DEG_TO_RAD
+            speed = np.sqrt(dx[on_paddle] ** 2 + dy[on_paddle] ** 2)
+            dx[on_paddle] = -speed * np.sin(bounce)
+            dy[on_paddle] = -speed * np.cos(bounce)
+            y[on_paddle] = game.paddle_y - size
+
+        # 下に落ちたボールを取り除き、残りを前に詰める
+        keep = y < game.height
+        if not keep.all():
+            kept = int(keep.sum())
+            for array in (self.x, self.y, self.dx, self.dy):
+                array[:kept] = array[:n][keep]
+            self.count = kept
+
+    def build_cells(self, game):
+        # ブロックを BlockGrid と同じ大きさのセルに登録した表 (行, 列, セル内の番号) -> ブロック番号
+        blocks = game.blocks
+        cell_width = game.block_width
+        cell_height = game.block_height
+        entries = {}
+        for i in range(len(blocks)):
+            for key in game.block_grid.cell_range(blocks.x[i], blocks.y[i], cell_width, cell_height):
+                entries.setdefault(key, []).append(i)
+        if not entries:
+            self.cells = None
+            return
+        cols = [key[0] for key in entries]
+        rows = [key[1] for key in entries]
+        self.col_origin = min(cols)
+        self.row_origin = min(rows)
+        depth = max(len(indices) for indices in entries.values())
+        cells = np.full((max(rows) - self.row_origin + 1, max(cols) - self.col_origin + 1, depth), -1,
+                        dtype=np.int64)
+        for (col, row), indices in entries.items():
+            cells[row - self.row_origin, col - self.col_origin, :len(indices)] = indices
+        self.cells = cells
+        self.block_x = np.array(blocks.x)
+        self.block_y = np.array(blocks.y)
+
+    def check_collisions(self, game):
+        n = self.count
+        if n == 0:
+            return
+        if self.cells_version != game.blocks.version:
+            self.build_cells(game)
+            self.cells_version = game.blocks.version
+        if self.cells is None or game.blocks.live == 0:
+            return
+
+        size = self.size
+        x = self.x[:n]
+        y = self.y[:n]
+
+        # パドルに触れているボールがあればコンボはそこで途切れる
+        if np.any((y + size > game.paddle_y) &
+                  (x + size > game.paddle_x) &
+                  (x < game.paddle_x + game.paddle_width)):
+            game.current_combo = 0
+            game.combo_timer = 0
+
+        # 各ボールが重なりうる 2x2 セルに登録されたブロックを候補にする
+        cells = self.cells
+        rows, cols, depth = cells.shape
+        col0 = np.floor(x / game.block_width).astype(np.int64) - self.col_origin
+        row0 = np.floor(y / game.block_height).astype(np.int64) - self.row_origin
+        ball_index = []
+        block_index = []
+        for row_offset in (0, 1):
+            row = row0 + row_offset
+            for col_offset in (0, 1):
+                col = col0 + col_offset
+                inside = np.flatnonzero((row >= 0) & (row < rows) & (col >= 0) & (col < cols))
+                if len(inside) == 0:
+                    continue
+                candidates = cells[row[inside], col[inside]]
+                balls = np.repeat(inside, depth)
+                candidates = candidates.ravel()
+                valid = candidates >= 0
+                ball_index.append(balls[valid])
+                block_index.append(candidates[valid])
+        if not ball_index:
+            return
+        ball_index = np.concatenate(ball_index)
+        block_index = np.concatenate(block_index)
+
+        alive = np.frombuffer(bytes(game.blocks.active), dtype=np.uint8).astype(bool)
+        block_x = self.block_x[block_index]
+        block_y = self.block_y[block_index]
+        hit = (alive[block_index] &
+               (x[ball_index] + size > block_x) &
+               (x[ball_index] < block_x + game.block_width) &
+               (y[ball_index] + size > block_y) &
+               (y[ball_index] < block_y + game.block_height))
+        if not hit.any():
+            return
+        ball_index = ball_index[hit]
+        block_index = block_index[hit]
+
+        # 同じブロックに複数のボールが当たったら番号の小さいボールだけが壊したことにする
+        order = np.lexsort((ball_index, block_index))
+        ball_index = ball_index[order]
+        block_index = block_index[order]
+        first = np.ones(len(block_index), dtype=bool)
+        first[1:] = block_index[1:] != block_index[:-1]
+        ball_index = ball_index[first]
+        block_index = block_index[first]
+
+        # 壊したブロック1つごとに dy を反転する（偶数個なら元に戻る）
+        destroyed = np.bincount(ball_index, minlength=n)
+        self.dy[:n][destroyed % 2 == 1] *= -1
+
+        # このフレームに壊れたブロックをボール順にまとめて処理する
+        order = np.lexsort((block_index, ball_index))
+        last_ball = int(ball_index[order[-1]])
+        game.break_blocks(block_index[order].tolist(), float(x[last_ball]), float(y[last_ball]))
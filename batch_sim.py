@@ -0,0 +1,277 @@
+import sys
+import time
+
+import numpy as np
+
+from game_core import FPS, BTN_LEFT, BTN_RIGHT, BALL_SIZE, PADDLE_SPEED, Game, follow_ball_input, run_headless
+
+
+def grid_layout(level):
+    # Level のブロックが等間隔の格子に並んでいるとき、(left, top, pitch_x, pitch_y) と
+    # 格子の形をした生存マスクの雛形を返す
+    xs = np.asarray(level.x)
+    ys = np.asarray(level.y)
+    left = xs.min()
+    top = ys.min()
+    gaps_x = np.diff(np.unique(xs))
+    gaps_y = np.diff(np.unique(ys))
+    pitch_x = gaps_x.min() if len(gaps_x) else level.block_width + 1
+    pitch_y = gaps_y.min() if len(gaps_y) else level.block_height + 1
+    cols = np.rint((xs - left) / pitch_x).astype(np.int64)
+    rows = np.rint((ys - top) / pitch_y).astype(np.int64)
+    if (pitch_x < level.block_width or pitch_y < level.block_height or
+            not np.array_equal(cols * pitch_x + left, xs) or not np.array_equal(rows * pitch_y + top, ys)):
+        raise ValueError("BatchGame needs a level laid out on a regular grid")
+    alive = np.zeros((rows.max() + 1, cols.max() + 1), dtype=bool)
+    alive[rows, cols] = True
+    return left, top, pitch_x, pitch_y, alive
+
+
+class BatchGame:
+    """N 個のゲームを NumPy 配列で持ち、1回の step で全部まとめて進める。
+
+    Game と同じ順序でパドル移動・コンボタイマー・ボール移動と反射・ブロック衝突・
+    コンボボーナス計算を行う。演出（パーティクル、爆発、画面揺れ）とアイテムは扱わず、
+    ボールは1ゲームにつき1個。クリア時間は実時間ではなくフレーム数から計算する。
+    画面・パドル・ボールの速さ・コンボの設定と盤面は game（作った直後の Game。None なら既定の
+    Game）から取るので、balance.py と同じように Game の値を変えて試せる。
+    """
+
+    def __init__(self, n, seed=None, game=None):
+        if game is None:
+            game = Game(effects=False)
+        if game.ball_storm:
+            raise ValueError("BatchGame does not support ball_storm")
+        self.n = n
+        self.width = game.width
+        self.height = game.height
+        self.rng = np.random.default_rng(seed)
+
+        ball = game.balls[0]
+        self.start_paddle_x = game.paddle_x
+        self.start_ball_x = ball.x
+        self.start_ball_y = ball.y
+        self.paddle_width = game.paddle_width
+        self.paddle_y = game.paddle_y
+        self.ball_speed = game.ball_speed
+        self.max_combo_timer = game.max_combo_timer
+        self.combo_bonus_per_combo = game.combo_bonus_per_combo
+
+        self.block_width = game.block_width
+        self.block_height = game.block_height
+        self.block_left, self.block_top, self.pitch_x, self.pitch_y, self.start_alive = grid_layout(game.level)
+        self.rows, self.cols = self.start_alive.shape
+
+        self.paddle_x = np.zeros(n)
+        self.ball_x = np.zeros(n)
+        self.ball_y = np.zeros(n)
+        self.ball_dx = np.zeros(n)
+        self.ball_dy = np.zeros(n)
+        self.alive = np.zeros((n, self.rows, self.cols), dtype=bool)
+        self.blocks_left = np.zeros(n, dtype=np.int32)
+
+        self.current_combo = np.zeros(n, dtype=np.int32)
+        self.max_combo = np.zeros(n, dtype=np.int32)
+        self.combo_timer = np.zeros(n, dtype=np.int32)
+        self.total_combo_bonus = np.zeros(n)
+
+        self.frame = np.zeros(n, dtype=np.int32)
+        self.game_cleared = np.zeros(n, dtype=bool)
+        self.game_over = np.zeros(n, dtype=bool)
+        self.clear_time = np.zeros(n)
+
+        self.reset()
+
+    def reset(self, mask=None):
+        # mask が True のゲームだけ初期状態に戻す（None なら全部）
+        if mask is None:
+            mask = np.ones(self.n, dtype=bool)
+        count = int(mask.sum())
+        if count == 0:
+            return
+
+        self.paddle_x[mask] = self.start_paddle_x
+        self.ball_x[mask] = self.start_ball_x
+        self.ball_y[mask] = self.start_ball_y
+        angle = np.radians(self.rng.uniform(-60, 60, count))
+        self.ball_dx[mask] = self.ball_speed * np.sin(angle)
+        self.ball_dy[mask] = -self.ball_speed * np.cos(angle)
+        self.alive[mask] = self.start_alive
+        self.blocks_left[mask] = self.start_alive.sum()
+
+        self.current_combo[mask] = 0
+        self.max_combo[mask] = 0
+        self.combo_timer[mask] = 0
+        self.total_combo_bonus[mask] = 0
+
+        self.frame[mask] = 0
+        self.game_cleared[mask] = False
+        self.game_over[mask] = False
+        self.clear_time[mask] = 0
+
+    @property
+    def done(self):
+        return self.game_cleared | self.game_over
+
+    def step(self, buttons=None):
+        # buttons: 各ゲームの BTN_* ビットフラグ配列（None なら入力なし）
+        # マスクで抜き出さず、配列全体に np.where をかける方が N が大きいときに速い
+        playing = ~(self.game_cleared | self.game_over)
+        self.frame += playing
+
+        if buttons is not None:
+            buttons = np.asarray(buttons)
+            moved = np.where((buttons & BTN_RIGHT) != 0,
+                             np.minimum(self.paddle_x + PADDLE_SPEED, self.width - self.paddle_width),
+                             self.paddle_x)
+            moved = np.where((buttons & BTN_LEFT) != 0, np.maximum(moved - PADDLE_SPEED, 0), moved)
+            self.paddle_x = np.where(playing, moved, self.paddle_x)
+
+        timer_running = self.combo_timer > 0
+        self.combo_timer -= playing & timer_running
+        self.current_combo = np.where(playing & ~timer_running, 0, self.current_combo)
+
+        self.move_balls(playing)
+
+        fell = playing & (self.ball_y >= self.height)
+        self.game_over |= fell
+        playing &= ~fell
+
+        self.check_collisions(playing)
+
+        cleared = playing & (self.blocks_left == 0)
+        if cleared.any():
+            self.game_cleared |= cleared
+            elapsed = self.frame[cleared] / FPS
+            self.clear_time[cleared] = np.maximum(0, elapsed - self.total_combo_bonus[cleared])
+
+    def move_balls(self, playing):
+        next_x = self.ball_x + self.ball_dx * playing
+        next_y = self.ball_y + self.ball_dy * playing
+
+        dx = np.where(next_x < 0, np.abs(self.ball_dx), self.ball_dx)
+        dx = np.where(next_x > self.width - BALL_SIZE, -np.abs(self.ball_dx), dx)
+        dy = np.where(next_y < 0, np.abs(self.ball_dy), self.ball_dy)
+        x = np.clip(next_x, 0, self.width - BALL_SIZE)
+        y = np.maximum(next_y, 0)
+
+        # Ball.update と同じ、当たった位置で角度が変わるパドル反射
+        paddle_y = self.paddle_y
+        paddle_width = self.paddle_width
+        on_paddle = (playing &
+                     (y + BALL_SIZE > paddle_y) &
+                     (x + BALL_SIZE > self.paddle_x) &
+                     (x < self.paddle_x + paddle_width))
+        if on_paddle.any():
+            idx = np.flatnonzero(on_paddle)
+            half = paddle_width / 2
+            normalized = ((self.paddle_x[idx] + half) - x[idx]) / half
+            bounce = np.radians(normalized * 60)
+            speed = np.sqrt(dx[idx] ** 2 + dy[idx] ** 2)
+            dx[idx] = -speed * np.sin(bounce)
+            dy[idx] = -speed * np.cos(bounce)
+            y[idx] = paddle_y - BALL_SIZE
+
+        self.ball_x = x
+        self.ball_y = y
+        self.ball_dx = dx
+        self.ball_dy = dy
+
+    def check_collisions(self, playing):
+        x = self.ball_x
+        y = self.ball_y
+
+        hit_paddle = (playing &
+                      (y + BALL_SIZE > self.paddle_y) &
+                      (x + BALL_SIZE > self.paddle_x) &
+                      (x < self.paddle_x + self.paddle_width))
+        if hit_paddle.any():
+            self.current_combo[hit_paddle] = 0
+            self.combo_timer[hit_paddle] = 0
+
+        # ボール (2x2) が重なりうるのは周囲 2x2 セルだけなので、その4つだけ調べる
+        rows = self.rows
+        cols = self.cols
+        block_width = self.block_width
+        block_height = self.block_height
+        alive = self.alive.reshape(self.n, rows * cols)
+        col0 = np.floor((x - self.block_left) / self.pitch_x).astype(np.int64)
+        row0 = np.floor((y - self.block_top) / self.pitch_y).astype(np.int64)
+        near = playing & (row0 >= -1) & (row0 < rows) & (col0 >= -1) & (col0 < cols)
+        games = np.flatnonzero(near)
+        if len(games) == 0:
+            return
+        x = x[games]
+        y = y[games]
+        col0 = col0[games]
+        row0 = row0[games]
+        destroyed = np.zeros(len(games), dtype=np.int32)
+        for row_offset in (0, 1):
+            row = row0 + row_offset
+            block_y = row * self.pitch_y + self.block_top
+            row_hit = (row >= 0) & (row < rows) & (y + BALL_SIZE > block_y) & (y < block_y + block_height)
+            for col_offset in (0, 1):
+                col = col0 + col_offset
+                block_x = col * self.pitch_x + self.block_left
+                hit = (row_hit & (col >= 0) & (col < cols) &
+                       (x + BALL_SIZE > block_x) & (x < block_x + block_width))
+                cell = np.where(hit, row * cols + col, 0)
+                hit &= alive[games, cell]
+                alive[games[hit], cell[hit]] = False
+                destroyed += hit
+
+        broke = destroyed > 0
+        if not broke.any():
+            return
+        games = games[broke]
+        destroyed = destroyed[broke]
+
+        # 壊したブロック1つごとに dy を反転する（偶数個なら元に戻る）
+        self.ball_dy[games] *= np.where(destroyed % 2 == 1, -1, 1)
+        self.blocks_left[games] -= destroyed
+
+        # 現在のコンボ数を更新し、増えた分だけボーナス時間を加算する
+        old_combo = self.current_combo[games]
+        combo = old_combo + destroyed
+        old_bonus = np.where(old_combo >= 2, old_combo * self.combo_bonus_per_combo, 0)
+        new_bonus = np.where(combo >= 2, combo * self.combo_bonus_per_combo, 0)
+        self.total_combo_bonus[games] += np.where(combo >= 2, new_bonus - old_bonus, 0)
+        self.current_combo[games] = combo
+        self.max_combo[games] = np.maximum(self.max_combo[games], combo)
+        self.combo_timer[games] = self.max_combo_timer
+
+    def follow_ball_buttons(self):
+        # follow_ball_input をまとめて計算したもの
+        center = self.paddle_x + self.paddle_width / 2
+        ball_center = self.ball_x + BALL_SIZE / 2
+        buttons = np.zeros(self.n, dtype=np.int32)
+        buttons[ball_center < center - 2] = BTN_LEFT
+        buttons[ball_center > center + 2] = BTN_RIGHT
+        return buttons
+
+
+def compare_throughput(n=16384, frames=1000, repeat=3):
+    # 1ゲームずつ Game を回す場合と BatchGame の1ゲームあたりのフレーム速度を比べる。
+    # 他の処理の影響を減らすため、どちらも何回か回して一番速かった回の値を使う
+    single_fps = 0
+    batch_fps = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run_headless(frames, follow_ball_input)
+        single_fps = max(single_fps, frames / (time.perf_counter() - start))
+
+        batch = BatchGame(n, seed=0)
+        start = time.perf_counter()
+        for _ in range(frames):
+            batch.step(batch.follow_ball_buttons())
+            batch.reset(batch.done)
+        batch_fps = max(batch_fps, n * frames / (time.perf_counter() - start))
+    return single_fps, batch_fps
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 16384
+    frames = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    single_fps, batch_fps = compare_throughput(n, frames)
+    print(f"Game:      {single_fps:12.0f} game-frames/s")
+    print(f"BatchGame: {batch_fps:12.0f} game-frames/s (N={n}, x{batch_fps / single_fps:.0f})")
@@ -0,0 +1,287 @@
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from game_core import Game, BTN_RESTART, follow_ball_input
+from levels import build_level, random_cells
+
+# ベースラインは計測したマシンでの値なので、別のマシンでは --update-baseline で取り直す
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+
+# ベースラインからこれ以上悪くなったら失敗にする
+MAX_FPS_DROP = 0.25
+MAX_P99_GROWTH = 0.50
+MAX_MEMORY_GROWTH = 0.50
+MAX_RESET_GROWTH = 0.50
+# これより小さい1フレームあたりの時間の差は、fps が下がっていてもノイズとして無視する
+# （30 FPS の1フレーム 33ms の 3%。1CPU のマシンでは 1ms 前後のシナリオが 30% 以上ぶれる）
+MIN_FRAME_DELTA_MS = 1.0
+MIN_P99_DELTA_MS = 0.05  # これより小さい p99 の差はノイズとして無視する
+MIN_RESET_DELTA_US = 5.0  # これより小さいリスタート時間の差はノイズとして無視する
+RESETS = 2000  # リスタート (init_game) の時間を測る回数
+
+
+# --- シナリオ ---------------------------------------------------------------
+# setup(game) は開始時とリスタートのたびに呼ばれ、step(game) は毎フレーム update の
+# 直前に呼ばれて入力を返す。どちらも計測時間に含まれる。
+
+def setup_steady(game):
+    # アイテムを出さず、ボール1個のラリーを続ける
+    game.item_drop_rate = 0
+
+
+def step_steady(game):
+    if game.game_cleared or game.game_over:
+        return BTN_RESTART
+    return follow_ball_input(game)
+
+
+def setup_multiball(game):
+    # パドルを画面幅いっぱいにして、数百個のボールを落とさずに跳ね続けさせる
+    game.item_drop_rate = 0
+    game.paddle_x = 0
+    game.paddle_width = game.width
+    while len(game.balls) < 300:
+        game.add_new_ball()
+
+
+def step_multiball(game):
+    if game.game_cleared or game.game_over:
+        game.init_game()
+        setup_multiball(game)
+    return 0
+
+
+def setup_combo(game):
+    game.item_drop_rate = 0
+
+
+def step_combo(game):
+    # 8フレームごとに全ブロックの位置で最大級のコンボ演出（爆発とパーティクル）を起こす
+    if game.game_cleared or game.game_over:
+        game.init_game()
+    if game.frame_count % 8 == 0:
+        combo = 12
+        blocks = game.blocks
+        for i in range(len(blocks)):
+            center_x = blocks.x[i] + game.block_width / 2
+            center_y = blocks.y[i] + game.block_height / 2
+            game.explosion_effects.spawn(center_x, center_y, combo)
+            game.create_particles(blocks.x[i], blocks.y[i], blocks.color[i], combo * 4)
+    return follow_ball_input(game)
+
+
+def setup_collapse(game):
+    # 70個のブロックが全部回転しながら崩れ落ちるゲームオーバー演出
+    game.start_game_over()
+    blocks = game.blocks
+    for i in range(len(blocks)):
+        if blocks.rotate_speed[i] == 0:
+            blocks.rotate_speed[i] = game.rng.uniform(-15, 15)
+
+
+def step_collapse(game):
+    if game.game_over_timer >= 60:
+        game.init_game()
+        setup_collapse(game)
+    return 0
+
+
+def setup_play(game):
+    pass
+
+
+def step_play(game):
+    # 普通に遊び、クリアやゲームオーバーのたびにリスタートする
+    if game.game_cleared or game.game_over:
+        return BTN_RESTART
+    return follow_ball_input(game)
+
+
+def setup_clear(game):
+    # 3個のボールが残った状態で最後のブロックを壊し、クリア画面（ボーナス表示つき）を出す
+    game.add_new_ball()
+    game.add_new_ball()
+    game.total_combo_bonus = 1.5
+    game.max_combo = 15
+    blocks = game.blocks
+    for i in range(len(blocks)):
+        blocks.active[i] = 0
+    blocks.live = 0
+
+
+def step_clear(game):
+    return 0
+
+
+def setup_storm(game):
+    # ボールストームモードで 5000 個のボールを跳ね続けさせる
+    game.item_drop_rate = 0
+    game.paddle_x = 0
+    game.paddle_width = game.width
+    game.balls.add(80, 90, game.rng, count=5000 - len(game.balls))
+
+
+def step_storm(game):
+    if game.game_cleared or game.game_over:
+        game.init_game()
+        setup_storm(game)
+    return 0
+
+
+# 崩落の大きな盤面用: 640x480 の画面に 1700 個あまりのブロック
+LARGE_BOARD = {'width': 640, 'height': 480, 'level': build_level(random_cells(56, 44, seed=0))}
+
+
+# シナリオの名前 -> (setup, step, Game に渡す引数)。render_check.py と alloc_check.py も
+# start_scenario で名前からここのシナリオを使う
+SCENARIO_STEPS = {
+    'steady': (setup_steady, step_steady, {}),
+    'multiball': (setup_multiball, step_multiball, {}),
+    'combo': (setup_combo, step_combo, {}),
+    'collapse': (setup_collapse, step_collapse, {}),
+    'collapse_large': (setup_collapse, step_collapse, LARGE_BOARD),
+    'storm': (setup_storm, step_storm, {'ball_storm': True}),
+    'play': (setup_play, step_play, {}),
+    'clear': (setup_clear, step_clear, {}),
+}
+
+
+def start_scenario(name, seed=0, **game_args):
+    # シナリオの Game を作って setup まで済ませ、(game, step) を返す。game_args はシナリオの
+    # Game に渡す引数より優先する
+    setup, step, options = SCENARIO_STEPS[name]
+    game = Game(seed=seed, **dict(options, **game_args))
+    setup(game)
+    return game, step
+
+
+# (名前, フレーム数)
+SCENARIOS = [
+    ('steady', 20000),
+    ('multiball', 600),
+    ('combo', 600),
+    ('collapse', 3000),
+    ('collapse_large', 300),
+    ('storm', 600),
+]
+
+
+# --- 計測 -------------------------------------------------------------------
+
+def run_frames(name, frames, seed):
+    game, step = start_scenario(name, seed)
+    perf_counter = time.perf_counter
+    frame_times = []
+    for _ in range(frames):
+        start = perf_counter()
+        game.update(step(game))
+        frame_times.append(perf_counter() - start)
+    return game, frame_times
+
+
+def measure_reset(game, resets=RESETS):
+    # プレイ後のゲームを続けてリスタートさせ、1回あたりの時間を返す
+    init_game = game.init_game
+    start = time.perf_counter()
+    for _ in range(resets):
+        init_game()
+    return (time.perf_counter() - start) / resets
+
+
+def measure(name, frames, seed=0, repeat=3):
+    # 他の処理の影響を減らすため、何回か回して一番速かった回の値を使う
+    best = None
+    reset = None
+    for _ in range(repeat):
+        game, frame_times = run_frames(name, frames, seed)
+        if best is None or sum(frame_times) < sum(best):
+            best = frame_times
+        reset_time = measure_reset(game)
+        if reset is None or reset_time < reset:
+            reset = reset_time
+    total = sum(best)
+    ordered = sorted(best)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+
+    # メモリは tracemalloc で遅くなるので別に短く回して測る
+    tracemalloc.start()
+    run_frames(name, min(frames, 300), seed)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'fps': frames / total,
+        'p99_ms': p99 * 1000,
+        'peak_kb': peak / 1024,
+        'reset_us': reset * 1e6,
+    }
+
+
+def compare(name, result, baseline):
+    # ベースラインより悪くなった項目のメッセージを返す
+    failures = []
+    if (result['fps'] < baseline['fps'] * (1 - MAX_FPS_DROP) and
+            1000 / result['fps'] - 1000 / baseline['fps'] > MIN_FRAME_DELTA_MS):
+        failures.append(f"{name}: fps {result['fps']:.0f} < baseline {baseline['fps']:.0f}")
+    if (result['p99_ms'] > baseline['p99_ms'] * (1 + MAX_P99_GROWTH) and
+            result['p99_ms'] - baseline['p99_ms'] > MIN_P99_DELTA_MS):
+        failures.append(f"{name}: p99 {result['p99_ms']:.3f}ms > baseline {baseline['p99_ms']:.3f}ms")
+    if result['peak_kb'] > baseline['peak_kb'] * (1 + MAX_MEMORY_GROWTH):
+        failures.append(f"{name}: peak memory {result['peak_kb']:.0f}KB > baseline {baseline['peak_kb']:.0f}KB")
+    if ('reset_us' in baseline and result['reset_us'] > baseline['reset_us'] * (1 + MAX_RESET_GROWTH) and
+            result['reset_us'] - baseline['reset_us'] > MIN_RESET_DELTA_US):
+        failures.append(f"{name}: reset {result['reset_us']:.1f}us > baseline {baseline['reset_us']:.1f}us")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless benchmarks for simple_game")
+    parser.add_argument('scenarios', nargs='*', help="scenarios to run (default: all)")
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--update-baseline', action='store_true',
+                        help="store these results as the new baseline")
+    parser.add_argument('--frames-scale', type=float, default=1.0,
+                        help="multiply every scenario's frame count")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="runs per scenario; the fastest one is reported")
+    args = parser.parse_args(argv)
+
+    selected = [s for s in SCENARIOS if not args.scenarios or s[0] in args.scenarios]
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = {}
+    failures = []
+    print(f"{'scenario':<16}{'fps':>10}{'p99 ms':>10}{'peak KB':>10}{'reset us':>10}")
+    for name, frames in selected:
+        result = measure(name, max(1, int(frames * args.frames_scale)), repeat=args.repeat)
+        results[name] = result
+        print(f"{name:<16}{result['fps']:10.0f}{result['p99_ms']:10.3f}{result['peak_kb']:10.0f}"
+              f"{result['reset_us']:10.1f}")
+        if name in baseline and not args.update_baseline:
+            failures += compare(name, result, baseline[name])
+
+    if args.update_baseline:
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    if failures:
+        print("\nPERFORMANCE REGRESSION:")
+        for failure in failures:
+            print("  " + failure)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
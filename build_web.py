@@ -0,0 +1,222 @@
+import argparse
+import ast
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import urllib.request
+import zipfile
+
+import pyxel
+
+# Web 版（index.html）を速く起動させるための配布物を作る。
+#   dist/web/simple_game.pyxapp  実行に使うモジュールだけを入れたアプリ（ソースと、コンパイル
+#                                済みの .pyc を入れる。pyc は展開後も確認なしで読み込まれる）
+#   dist/web/vendor/pyxel.js     CDN から取ってきた pyxel.js（バージョンを固定して同梱する）
+#   dist/web/index.html          上の2つをローカルから読み込むページ
+# --measure をつけると、ソースのまま動かしたときとアプリを展開して動かしたときの、最初の
+# フレームが出るまでの時間をウィンドウなしで測って並べる。
+ROOT = os.path.dirname(os.path.abspath(__file__))
+ENTRY = "simple_game.py"
+APP_NAME = "simple_game"
+STARTUP_SCRIPT = "main.py"
+# 起動用のスクリプト。pyxel はこれをソースのまま実行するので、中身は import だけにして
+# 本体はコンパイル済みのモジュールから読ませる
+STARTUP_SOURCE = "import simple_game\n\nsimple_game.App()\n"
+PYXEL_JS_URL = f"https://cdn.jsdelivr.net/gh/kitao/pyxel@{pyxel.VERSION}/wasm/pyxel.js"
+ZIP_DATE = (1980, 1, 1, 0, 0, 0)  # 中身が同じなら同じ .pyxapp になるよう日時は固定する
+
+# 最初のフレームまでの時間を測る子プロセス。argv[1] のディレクトリのモジュールで起動する
+FIRST_FRAME_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import pyxel
+loaded = time.perf_counter()
+import simple_game
+imported = time.perf_counter()
+pyxel.init(160, 120)
+app = simple_game.App(pyxel)
+ready = time.perf_counter()
+app.update()
+app.draw()
+pyxel.flip()
+done = time.perf_counter()
+print(json.dumps({'pyxel': loaded - start, 'import': imported - loaded, 'setup': ready - imported,
+                  'frame': done - ready, 'total': done - start}))
+"""
+PHASES = ('pyxel', 'import', 'setup', 'frame', 'total')
+
+
+# --- ビルド -----------------------------------------------------------------
+
+def local_imports(path):
+    # path のモジュールが import しているこのディレクトリのモジュール名（関数の中での import も含む）
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), path)
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            names.add(node.module)
+    return {name for name in names if os.path.exists(os.path.join(ROOT, name + ".py"))}
+
+
+def module_closure(entry=ENTRY):
+    # entry から import をたどって届くモジュールのファイル名（開発用のスクリプトは入らない）
+    found = set()
+    pending = [os.path.splitext(entry)[0]]
+    while pending:
+        name = pending.pop()
+        if name in found:
+            continue
+        found.add(name)
+        pending.extend(local_imports(os.path.join(ROOT, name + ".py")) - found)
+    return sorted(name + ".py" for name in found)
+
+
+def stage_app(app_dir, modules, python):
+    # app_dir にモジュールと起動スクリプトを置き、python でコンパイルしておく。pyc は
+    # unchecked-hash なので、展開で更新日時が変わってもソースと比べずにそのまま使われる
+    # （web 版の Python と同じバージョンでコンパイルしたときだけ効く。違えばソースから動く）
+    os.makedirs(app_dir)
+    for module in modules:
+        shutil.copy2(os.path.join(ROOT, module), os.path.join(app_dir, module))
+    with open(os.path.join(app_dir, STARTUP_SCRIPT), "w", encoding="utf-8") as f:
+        f.write(STARTUP_SOURCE)
+    with open(os.path.join(app_dir, pyxel.APP_STARTUP_SCRIPT_FILE), "w", encoding="utf-8") as f:
+        f.write(STARTUP_SCRIPT)
+    subprocess.run([python, "-m", "compileall", "-q", "--invalidation-mode", "unchecked-hash", app_dir],
+                   check=True)
+
+
+def write_pyxapp(app_dir, path):
+    # pyxel package と同じ形（APP_NAME/ 以下にアプリの中身）の zip を書く
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for folder, dirs, files in sorted(os.walk(app_dir)):
+            dirs.sort()
+            for name in sorted(files):
+                full = os.path.join(folder, name)
+                arcname = os.path.join(APP_NAME, os.path.relpath(full, app_dir)).replace(os.sep, "/")
+                info = zipfile.ZipInfo(arcname, ZIP_DATE)
+                info.compress_type = zipfile.ZIP_DEFLATED
+                with open(full, "rb") as f:
+                    zf.writestr(info, f.read())
+
+
+def vendor_file(source, path):
+    # source（URL かファイル）を path に置く
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if re.match(r"https?://", source):
+        with urllib.request.urlopen(source, timeout=30) as response, open(path, "wb") as f:
+            shutil.copyfileobj(response, f)
+    else:
+        shutil.copyfile(source, path)
+
+
+def write_index(path, pyxel_js, bundle):
+    # リポジトリの index.html を元に、pyxel.js とアプリをローカルから読み込むページを書く。
+    # アプリは pyxel.js の読み込みと並行して取りに行くよう preload しておく
+    with open(os.path.join(ROOT, "index.html"), encoding="utf-8") as f:
+        html = f.read()
+    html, scripts = re.subn(r'<script src="[^"]*pyxel\.js"></script>',
+                            f'<script src="{pyxel_js}"></script>', html)
+    html, players = re.subn(r'<pyxel-run name="simple_game\.py"></pyxel-run>',
+                            f'<pyxel-play name="{bundle}"></pyxel-play>', html)
+    if scripts != 1 or players != 1:
+        raise ValueError("index.html does not load pyxel.js and simple_game.py the expected way")
+    html = html.replace("</head>", f'    <link rel="preload" href="{bundle}" as="fetch" crossorigin>\n</head>', 1)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(html)
+
+
+def build(out_dir, python=sys.executable, pyxel_js=PYXEL_JS_URL):
+    # out_dir に配布物を作り、アプリのパスを返す。pyxel_js が None なら CDN から読むページにする
+    bundle = APP_NAME + pyxel.APP_FILE_EXTENSION
+    modules = module_closure()
+    os.makedirs(out_dir, exist_ok=True)
+    with tempfile.TemporaryDirectory() as work:
+        app_dir = os.path.join(work, APP_NAME)
+        stage_app(app_dir, modules, python)
+        write_pyxapp(app_dir, os.path.join(out_dir, bundle))
+    if pyxel_js is None:
+        script = PYXEL_JS_URL
+    else:
+        script = "vendor/pyxel.js"
+        vendor_file(pyxel_js, os.path.join(out_dir, script))
+    write_index(os.path.join(out_dir, "index.html"), script, bundle)
+    return os.path.join(out_dir, bundle), modules
+
+
+# --- 起動時間 ---------------------------------------------------------------
+
+def first_frame_times(app_dir, runs):
+    # 新しいプロセスで app_dir から起動して最初のフレームを描くまでを runs 回測り、区間ごとの
+    # 中央値（秒）を返す。-B なので app_dir に pyc がなければ毎回ソースからコンパイルする
+    env = dict(os.environ)
+    env.setdefault("SDL_VIDEODRIVER", "offscreen")
+    env.setdefault("SDL_AUDIODRIVER", "dummy")
+    samples = {phase: [] for phase in PHASES}
+    command = [sys.executable, "-B", "-c", FIRST_FRAME_SCRIPT, app_dir]
+    for _ in range(runs):
+        result = subprocess.run(command, cwd=app_dir, env=env, capture_output=True, text=True, check=True)
+        times = json.loads(result.stdout.strip().splitlines()[-1])
+        for phase in PHASES:
+            samples[phase].append(times[phase])
+    return {phase: statistics.median(values) for phase, values in samples.items()}
+
+
+def measure_startup(bundle_path, modules, runs):
+    # ソースだけを置いたとき（web 版の今の読み込み方）とアプリを展開したときの時間を返す
+    results = {}
+    with tempfile.TemporaryDirectory() as work:
+        for module in modules:
+            shutil.copyfile(os.path.join(ROOT, module), os.path.join(work, module))
+        results['source'] = first_frame_times(work, runs)
+    with tempfile.TemporaryDirectory() as work:
+        with zipfile.ZipFile(bundle_path) as zf:
+            zf.extractall(work)
+        results['bundle'] = first_frame_times(os.path.join(work, APP_NAME), runs)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the fast-startup web bundle of simple_game")
+    parser.add_argument('--out', default=os.path.join(ROOT, "dist", "web"))
+    parser.add_argument('--python', default=sys.executable,
+                        help="interpreter that compiles the bytecode (use the web runtime's Python version)")
+    parser.add_argument('--pyxel-js', default=PYXEL_JS_URL, help="URL or file of pyxel.js to vendor")
+    parser.add_argument('--no-vendor', action='store_true', help="load pyxel.js from the CDN instead")
+    parser.add_argument('--measure', action='store_true', help="report time to first frame")
+    parser.add_argument('--runs', type=int, default=5, help="startups per measurement (median is reported)")
+    parser.add_argument('--budget-ms', type=float, default=None,
+                        help="fail if the bundle's time to first frame is above this")
+    args = parser.parse_args(argv)
+
+    try:
+        bundle_path, modules = build(args.out, args.python, None if args.no_vendor else args.pyxel_js)
+    except OSError as e:
+        print(f"build failed: {e} (pass --pyxel-js FILE or --no-vendor when offline)", file=sys.stderr)
+        return 1
+    print(f"{bundle_path}: {os.path.getsize(bundle_path)} bytes, {len(modules)} modules: {' '.join(modules)}")
+
+    if not args.measure:
+        return 0
+    results = measure_startup(bundle_path, modules, args.runs)
+    print(f"\n{'startup (ms)':<14}" + "".join(f"{phase:>9}" for phase in PHASES))
+    for name, times in results.items():
+        print(f"{name:<14}" + "".join(f"{times[phase] * 1000:9.1f}" for phase in PHASES))
+    total_ms = results['bundle']['total'] * 1000
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        print(f"\nSTARTUP REGRESSION: {total_ms:.1f}ms to first frame > budget {args.budget_ms:.1f}ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
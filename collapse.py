@@ -0,0 +1,46 @@
+import numpy as np
+
+# ゲームオーバー時の崩落を NumPy の配列演算でまとめて進める。Board の配列をそのまま
+# NumPy のビューとして書き換えるのでコピーはしない（ビューはこの関数の中だけで使う）。
+
+
+def _view(field):
+    return np.frombuffer(field, dtype=field.typecode)
+
+
+def update_collapse(game):
+    # Game.update_game_over のブロックごとのループと同じ結果になる。乱数もブロック番号順に
+    # 同じ回数だけ引くので、この後のゲームの展開も変わらない
+    blocks = game.blocks
+    active = np.frombuffer(blocks.active, dtype=np.uint8)
+    fall_delay = _view(blocks.fall_delay)
+
+    alive = active != 0
+    waiting = alive & (fall_delay > 0)
+    fall_delay[waiting] -= 1
+    moving = np.flatnonzero(alive & ~waiting)
+    if len(moving) == 0:
+        return
+
+    random = game.rng.random
+    accel = np.array([random() for _ in range(len(moving))])
+    x = _view(blocks.x)
+    y = _view(blocks.y)
+    fall_speed = _view(blocks.fall_speed)
+    rotation = _view(blocks.rotation)
+    rotate_speed = _view(blocks.rotate_speed)
+    horizontal_speed = _view(blocks.horizontal_speed)
+
+    # rng.uniform(0.5, 0.8) と同じ計算
+    fall_speed[moving] += 0.5 + (0.8 - 0.5) * accel
+    rotation[moving] += rotate_speed[moving]
+    rotate_speed[moving] *= 0.995
+    x[moving] += horizontal_speed[moving]
+    y[moving] += fall_speed[moving]
+
+    moved_x = x[moving]
+    margin = game.block_width * 2
+    gone = moving[(y[moving] > game.height) | (moved_x < -margin) | (moved_x > game.width + margin)]
+    if len(gone):
+        active[gone] = 0
+        blocks.live -= len(gone)
@@ -0,0 +1,188 @@
+# 命令の種類
+CLS = 0
+RECT = 1
+PSET = 2
+CIRC = 3
+TRI = 4
+TEXT = 5
+BLT = 6
+PAL = 7
+
+FONT_WIDTH = 4
+FONT_HEIGHT = 6
+
+
+class DisplayList:
+    """1フレーム分の描画命令をためておき、最後に submit でまとめて描く。
+
+    pyxel と同じ名前・引数の命令を受け付ける。画面の外に出ている命令はためる時点で捨て、
+    直前の命令と隙間なく並ぶ同じ色の rect は1つにまとめる（描く順番は変えない）。
+    命令は要素ごとのリストに上書きしていくので、フレームごとにオブジェクトは作らない。
+    """
+
+    def __init__(self, width, height, capacity=1024):
+        self.width = width
+        self.height = height
+        self.count = 0
+        self.op = [0] * capacity
+        self.x = [0.0] * capacity
+        self.y = [0.0] * capacity
+        self.w = [0.0] * capacity
+        self.h = [0.0] * capacity
+        self.color = [0] * capacity
+        self.extra = [None] * capacity
+        # 直近のフレームの集計（submit した命令数、捨てた数、まとめた数）
+        self.calls = 0
+        self.culled = 0
+        self.merged = 0
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.count = 0
+        self.culled = 0
+        self.merged = 0
+
+    def push(self, op, x, y, w, h, color, extra=None):
+        i = self.count
+        if i == len(self.op):
+            for field in (self.op, self.x, self.y, self.w, self.h, self.color, self.extra):
+                field.extend(field)
+        self.op[i] = op
+        self.x[i] = x
+        self.y[i] = y
+        self.w[i] = w
+        self.h[i] = h
+        self.color[i] = color
+        self.extra[i] = extra
+        self.count = i + 1
+
+    def visible(self, x, y, w, h):
+        # pyxel は座標を四捨五入するので、1画素の余裕を見て判定する
+        return x + w >= -1 and y + h >= -1 and x <= self.width and y <= self.height
+
+    # --- pyxel と同じ命令 ---------------------------------------------------
+
+    def cls(self, color):
+        self.push(CLS, 0, 0, 0, 0, color)
+
+    def rect(self, x, y, w, h, color):
+        if not self.visible(x, y, w, h):
+            self.culled += 1
+            return
+        i = self.count - 1
+        if i >= 0 and self.op[i] == RECT and self.color[i] == color:
+            last_x = self.x[i]
+            last_y = self.y[i]
+            last_w = self.w[i]
+            last_h = self.h[i]
+            if last_y == y and last_h == h:
+                if last_x + last_w == x:
+                    self.w[i] = last_w + w
+                    self.merged += 1
+                    return
+                if x + w == last_x:
+                    self.x[i] = x
+                    self.w[i] = last_w + w
+                    self.merged += 1
+                    return
+                if last_x == x and last_w == w:
+                    self.merged += 1
+                    return
+            elif last_x == x and last_w == w:
+                if last_y + last_h == y:
+                    self.h[i] = last_h + h
+                    self.merged += 1
+                    return
+                if y + h == last_y:
+                    self.y[i] = y
+                    self.h[i] = last_h + h
+                    self.merged += 1
+                    return
+        self.push(RECT, x, y, w, h, color)
+
+    def pset(self, x, y, color):
+        # 四捨五入した画素が画面内にあるかで判定する
+        if x < -0.5 or y < -0.5 or x >= self.width - 0.5 or y >= self.height - 0.5:
+            self.culled += 1
+            return
+        self.push(PSET, x, y, 0, 0, color)
+
+    def circ(self, x, y, r, color):
+        if not self.visible(x - r, y - r, r * 2, r * 2):
+            self.culled += 1
+            return
+        self.push(CIRC, x, y, r, r, color)
+
+    def tri(self, x1, y1, x2, y2, x3, y3, color):
+        left = min(x1, x2, x3)
+        top = min(y1, y2, y3)
+        if not self.visible(left, top, max(x1, x2, x3) - left, max(y1, y2, y3) - top):
+            self.culled += 1
+            return
+        self.push(TRI, x1, y1, x2, y2, color, (x3, y3))
+
+    def text(self, x, y, s, color):
+        if not self.visible(x, y, len(s) * FONT_WIDTH, FONT_HEIGHT):
+            self.culled += 1
+            return
+        self.push(TEXT, x, y, 0, 0, color, s)
+
+    def blt(self, x, y, img, u, v, w, h, colkey=None):
+        if not self.visible(x, y, abs(w), abs(h)):
+            self.culled += 1
+            return
+        self.push(BLT, x, y, w, h, colkey, (img, u, v))
+
+    def pal(self, col1=None, col2=None):
+        self.push(PAL, 0, 0, 0, 0, col2, col1)
+
+    # --- 描画 ---------------------------------------------------------------
+
+    def submit(self, backend):
+        # ためた命令を順に backend（pyxel モジュールか同じ命令を持つもの）で描く。
+        # backend に psets があれば、続いている pset はまとめて1回で渡す
+        op, xs, ys, ws, hs, colors, extras = self.op, self.x, self.y, self.w, self.h, self.color, self.extra
+        rect = backend.rect
+        pset = backend.pset
+        psets = getattr(backend, 'psets', None)
+        count = self.count
+        i = 0
+        while i < count:
+            kind = op[i]
+            if kind == PSET:
+                if psets is not None:
+                    end = i + 1
+                    while end < count and op[end] == PSET:
+                        end += 1
+                    if end - i > 1:
+                        psets(xs[i:end], ys[i:end], colors[i:end])
+                        i = end
+                        continue
+                pset(xs[i], ys[i], colors[i])
+            elif kind == RECT:
+                rect(xs[i], ys[i], ws[i], hs[i], colors[i])
+            elif kind == CIRC:
+                backend.circ(xs[i], ys[i], ws[i], colors[i])
+            elif kind == TEXT:
+                backend.text(xs[i], ys[i], extras[i], colors[i])
+            elif kind == BLT:
+                img, u, v = extras[i]
+                if colors[i] is None:
+                    backend.blt(xs[i], ys[i], img, u, v, ws[i], hs[i])
+                else:
+                    backend.blt(xs[i], ys[i], img, u, v, ws[i], hs[i], colors[i])
+            elif kind == TRI:
+                x3, y3 = extras[i]
+                backend.tri(xs[i], ys[i], ws[i], hs[i], x3, y3, colors[i])
+            elif kind == PAL:
+                if extras[i] is None:
+                    backend.pal()
+                else:
+                    backend.pal(extras[i], colors[i])
+            elif kind == CLS:
+                backend.cls(colors[i])
+            i += 1
+        self.calls = count
+        self.count = 0
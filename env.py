@@ -0,0 +1,291 @@
+import multiprocessing
+import random
+import sys
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from game_core import Game, FPS, BTN_LEFT, BTN_RIGHT
+from levels import default_level
+
+# 行動: 0 = 動かない, 1 = 左, 2 = 右
+ACTION_BUTTONS = (0, BTN_LEFT, BTN_RIGHT)
+NUM_ACTIONS = len(ACTION_BUTTONS)
+
+# 観測は float32 の1次元配列
+#   [0]                       パドルの x
+#   [1 : 1 + 5 * max_balls]   ボールごとに (x, y, dx, dy, 有無)。足りない分は 0
+#   [1 + 5 * max_balls :]     ブロックごとに残っていれば 1
+BALL_FIELDS = 5
+
+# 報酬
+BLOCK_REWARD = 1.0  # ブロック1個を壊すごと
+COMBO_REWARD = 10.0  # コンボボーナス1秒ごと（2コンボ目以降1つ増えるごとに 0.1 秒）
+CLEAR_REWARD = 100.0  # クリア時間 0 秒でクリアしたとき。CLEAR_TIME_LIMIT 秒で 0 になる
+CLEAR_TIME_LIMIT = 600
+GAME_OVER_REWARD = -10.0
+
+
+class BreakoutEnv:
+    """Game を強化学習用に包んだ環境。gymnasium と同じ形の reset / step を持つ。
+
+    reset(seed) は (観測, info)、step(action) は (観測, 報酬, 終了, 打ち切り, info) を返す。
+    クリアかゲームオーバーで終了、max_frames フレーム経っても終わらなければ打ち切り。
+    観測は毎回同じ配列に上書きするので、取っておくならコピーすること。
+    observation に配列を渡すとそこに直接書き込む（共有メモリ上の配列など）。
+    """
+
+    def __init__(self, max_balls=8, level=None, frame_skip=1, max_frames=CLEAR_TIME_LIMIT * FPS,
+                 observation=None, **game_options):
+        if level is None:
+            level = default_level()
+        self.max_balls = max_balls
+        self.frame_skip = frame_skip
+        self.max_frames = max_frames
+        if game_options.get('ball_storm'):
+            # 観測はボール1個ずつの属性から作るので、NumPy でまとめて持つボールストームには使えない
+            raise ValueError("BreakoutEnv does not support ball_storm")
+        # 観測に演出は要らないので、爆発やパーティクルは作らない
+        game_options.setdefault('effects', False)
+        self.game = Game(level=level, **game_options)
+        self.block_offset = 1 + BALL_FIELDS * max_balls
+        self.observation_size = self.block_offset + len(level)
+        if observation is None:
+            observation = np.zeros(self.observation_size, dtype=np.float32)
+        self.observation = observation
+        self.seed_rng = random.Random()
+        self.frames = 0
+        self.done = True
+
+    def reset(self, seed=None):
+        # seed を省略したときは直前に渡された seed から続く系列で決める（同じ seed なら同じ展開）
+        if seed is None:
+            seed = self.seed_rng.getrandbits(32)
+        else:
+            self.seed_rng.seed(seed)
+        game = self.game
+        game.reseed(seed)
+        game.init_game()
+        self.frames = 0
+        self.done = False
+        self.observe()
+        return self.observation, {'seed': seed}
+
+    def step(self, action):
+        if self.done:
+            raise RuntimeError("step() called on a finished episode; call reset() first")
+        game = self.game
+        buttons = ACTION_BUTTONS[action]
+        live = game.blocks.live
+        combo_bonus = game.total_combo_bonus
+        for _ in range(self.frame_skip):
+            game.update(buttons)
+            self.frames += 1
+            if game.game_cleared or game.game_over:
+                break
+
+        reward = (live - game.blocks.live) * BLOCK_REWARD
+        reward += (game.total_combo_bonus - combo_bonus) * COMBO_REWARD
+        terminated = game.game_cleared or game.game_over
+        truncated = not terminated and self.frames >= self.max_frames
+        info = {}
+        if game.game_cleared:
+            reward += CLEAR_REWARD * max(0.0, 1 - game.clear_time / CLEAR_TIME_LIMIT)
+        elif game.game_over:
+            reward += GAME_OVER_REWARD
+        if terminated or truncated:
+            self.done = True
+            info = episode_info(game, self.frames)
+        self.observe()
+        return self.observation, reward, terminated, truncated, info
+
+    def observe(self):
+        game = self.game
+        obs = self.observation
+        obs[0] = game.paddle_x
+        i = 1
+        balls = game.balls
+        for k in range(min(len(balls), self.max_balls)):
+            ball = balls[k]
+            obs[i] = ball.x
+            obs[i + 1] = ball.y
+            obs[i + 2] = ball.dx
+            obs[i + 3] = ball.dy
+            obs[i + 4] = 1
+            i += BALL_FIELDS
+        obs[i:self.block_offset] = 0
+        obs[self.block_offset:] = np.frombuffer(game.blocks.active, dtype=np.uint8)
+
+
+def episode_info(game, frames):
+    return {
+        'frames': frames,
+        'cleared': game.game_cleared,
+        'clear_time': game.clear_time,
+        'bonus_time': game.bonus_time,
+        'max_combo': game.max_combo,
+        'blocks_left': game.blocks.live,
+    }
+
+
+# --- 複数プロセスで並べる版 -------------------------------------------------
+
+def _worker(conn, start, stop, memory_names, n, observation_size, env_options):
+    # 担当する環境 [start, stop) を動かし、観測・報酬・終了フラグを共有メモリに直接書く
+    memories = [shared_memory.SharedMemory(name=name) for name in memory_names]
+    buffers = _buffers(memories, n, observation_size)
+    observations, actions, rewards, terminated, truncated = buffers
+    envs = [BreakoutEnv(observation=observations[i], **env_options) for i in range(start, stop)]
+    try:
+        while True:
+            command, seed = conn.recv()
+            if command == 'step':
+                conn.send(_step_all(envs, start, actions, rewards, terminated, truncated))
+            elif command == 'reset':
+                _reset_all(envs, start, seed)
+                conn.send(None)
+            else:
+                break
+    finally:
+        del observations, actions, rewards, terminated, truncated, buffers
+        for memory in memories:
+            memory.close()
+
+
+def _buffers(memories, n, observation_size):
+    return (
+        np.ndarray((n, observation_size), dtype=np.float32, buffer=memories[0].buf),
+        np.ndarray(n, dtype=np.uint8, buffer=memories[1].buf),
+        np.ndarray(n, dtype=np.float64, buffer=memories[2].buf),
+        np.ndarray(n, dtype=np.bool_, buffer=memories[3].buf),
+        np.ndarray(n, dtype=np.bool_, buffer=memories[4].buf),
+    )
+
+
+def _reset_all(envs, start, seed):
+    for i, env in enumerate(envs):
+        env.reset(None if seed is None else seed + start + i)
+
+
+def _step_all(envs, start, actions, rewards, terminated, truncated):
+    # 終わった環境はその場で reset する。返すのは終わった環境の (番号, info) だけ
+    finished = []
+    for i, env in enumerate(envs, start):
+        _, rewards[i], terminated[i], truncated[i], info = env.step(actions[i])
+        if env.done:
+            finished.append((i, info))
+            env.reset()
+    return finished
+
+
+class VectorEnv:
+    """BreakoutEnv を n 個まとめて動かす。workers 個のプロセスに分けて並列に進める。
+
+    観測 (n, observation_size)・行動・報酬・終了フラグは共有メモリ上の配列で、プロセス間
+    でコピーしない。step の戻り値の配列も毎回同じものなので、取っておくならコピーすること。
+    終わった環境は step の中で reset され、返る観測は次のエピソードの最初のもの。
+    workers=0 ならこのプロセスの中で順に動かす。
+    """
+
+    def __init__(self, n, workers=None, **env_options):
+        if workers is None:
+            workers = min(n, multiprocessing.cpu_count())
+        self.n = n
+        probe = BreakoutEnv(**env_options)
+        self.observation_size = probe.observation_size
+        sizes = (n * self.observation_size * 4, n, n * 8, n, n)
+        self.memories = [shared_memory.SharedMemory(create=True, size=size) for size in sizes]
+        buffers = _buffers(self.memories, n, self.observation_size)
+        self.observations, self.actions, self.rewards, self.terminated, self.truncated = buffers
+        self.processes = []
+        self.connections = []
+        self.envs = None
+        if workers == 0:
+            self.envs = [BreakoutEnv(observation=self.observations[i], **env_options) for i in range(n)]
+            return
+        names = [memory.name for memory in self.memories]
+        for w in range(workers):
+            start = n * w // workers
+            stop = n * (w + 1) // workers
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_worker,
+                args=(child, start, stop, names, n, self.observation_size, env_options),
+                daemon=True)
+            process.start()
+            child.close()
+            self.processes.append(process)
+            self.connections.append((parent, start))
+
+    def reset(self, seed=None):
+        # 環境 i の seed は seed + i
+        if self.envs is not None:
+            _reset_all(self.envs, 0, seed)
+        else:
+            for conn, start in self.connections:
+                conn.send(('reset', seed))
+            for conn, _ in self.connections:
+                conn.recv()
+        return self.observations
+
+    def step(self, actions):
+        # (観測, 報酬, 終了, 打ち切り, 終わった環境の {番号: info}) を返す
+        self.actions[:] = actions
+        if self.envs is not None:
+            finished = _step_all(self.envs, 0, self.actions, self.rewards, self.terminated, self.truncated)
+        else:
+            for conn, _ in self.connections:
+                conn.send(('step', None))
+            finished = []
+            for conn, _ in self.connections:
+                finished += conn.recv()
+        return self.observations, self.rewards, self.terminated, self.truncated, dict(finished)
+
+    def close(self):
+        for conn, _ in self.connections:
+            conn.send(('close', None))
+        for process in self.processes:
+            process.join()
+        self.connections = []
+        self.processes = []
+        self.envs = None
+        del self.observations, self.actions, self.rewards, self.terminated, self.truncated
+        for memory in self.memories:
+            memory.close()
+            memory.unlink()
+        self.memories = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def follow_ball_actions(observations, max_balls=8, paddle_width=24):
+    # 一番下のボールを追いかける簡単な方策（観測だけから決める）
+    end = 1 + BALL_FIELDS * max_balls
+    ball_y = observations[:, 2:end:BALL_FIELDS]
+    present = observations[:, 5:end:BALL_FIELDS] > 0
+    lowest = np.argmax(np.where(present, ball_y, -1), axis=1)
+    target = observations[np.arange(len(observations)), 1 + lowest * BALL_FIELDS] + 1
+    center = observations[:, 0] + paddle_width / 2
+    return np.where(target < center - 2, 1, np.where(target > center + 2, 2, 0)).astype(np.uint8)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    steps = 3000
+    with VectorEnv(n, workers=workers) as env:
+        workers = len(env.processes)
+        observations = env.reset(seed=0)
+        episodes = 0
+        start = time.perf_counter()
+        for _ in range(steps):
+            observations, rewards, terminated, truncated, finished = env.step(follow_ball_actions(observations))
+            episodes += len(finished)
+        elapsed = time.perf_counter() - start
+    print(f"{n} envs, {workers} workers: {n * steps / elapsed:.0f} steps/s, "
+          f"{episodes} episodes finished")
@@ -0,0 +1,195 @@
+import argparse
+import sys
+
+from benchmarks import LARGE_BOARD, setup_collapse
+from game_core import Game, BlockGrid, follow_ball_input
+from snapshot import snapshot, restore
+
+# 速くするために入れた実装が、素直な実装と同じ結果になるかをウィンドウなしで確かめる。
+# どれも seed を決めた2つのゲームを同じ入力で並べて回し、フレームごとに snapshot.snapshot の
+# バイト列（ゲームの展開に関わる状態の全部）を比べる。1フレームでも違えば失敗にする。
+
+
+def lockstep(a, b, frames):
+    # a と b を同じ入力（a を見た follow_ball_input）で frames フレーム回し、最初に状態が
+    # 食い違ったフレームを返す（なければ None）
+    for frame in range(frames):
+        buttons = follow_ball_input(a)
+        a.update(buttons)
+        b.update(buttons)
+        if snapshot(a) != snapshot(b):
+            return frame
+    return None
+
+
+# --- ブロックの索引 ---------------------------------------------------------
+
+class LinearScan(BlockGrid):
+    """BlockGrid の代わりに全ブロックを番号順に候補として返す（索引を入れる前の線形走査）。"""
+
+    def __init__(self, blocks):
+        super().__init__(blocks.block_width, blocks.block_height)
+        self.blocks = blocks
+
+    def query(self, x, y, width, height):
+        return range(len(self.blocks))
+
+
+def check_grid(frames):
+    # BlockGrid で候補を絞った当たり判定が、全ブロックを調べる当たり判定と同じ展開になるか。
+    # 通常の速さ、連続衝突判定の速さ、大きな盤面のそれぞれで、クリアやゲームオーバーからの
+    # リスタートも含めて比べる（大きな盤面は線形走査が遅いので短く回す）
+    failures = []
+    for name, options, seeds, share in (('default', {}, range(3), 1), ('swept', {'ball_speed': 6}, range(3), 1),
+                                        ('large', LARGE_BOARD, (0,), 0.25)):
+        for seed in seeds:
+            grid = Game(seed=seed, **options)
+            linear = Game(seed=seed, **options)
+            linear.block_grid = LinearScan(linear.blocks)
+            frame = lockstep(grid, linear, int(frames * share))
+            if frame is not None:
+                failures.append(f"{name} seed {seed}: grid and linear scan differ at frame {frame}")
+    return failures
+
+
+# --- リスタート -------------------------------------------------------------
+
+BOARD_FIELDS = ('x', 'y', 'color', 'active', 'fall_speed', 'rotation', 'rotate_speed', 'fall_delay',
+                'horizontal_speed')
+
+
+def reset_state(game):
+    # init_game が戻す状態を比べられる形にする（snapshot に入らない演出やボールの中身も含める）
+    scalars = {key: value for key, value in vars(game).items()
+               if isinstance(value, (int, float, str, bool))}
+    balls = [({key: value for key, value in vars(ball).items() if key != 'trail'}, len(ball.trail))
+             for ball in game.balls]
+    board = [getattr(game.blocks, field) for field in BOARD_FIELDS]
+    return (scalars, balls, len(game.items), board, game.blocks.live, dict(game.block_grid.cells),
+            len(game.paddle_trail), game.particles.count, game.explosion_effects.count, game.events.count,
+            dict(game.screen_shake), dict(game.combo_text), game.rng.getstate(), game.effects_rng.getstate())
+
+
+def check_reset(frames):
+    # 遊んだ後のゲームを init_game でその場で戻した状態が、同じ乱数の状態から始めた新しい Game と
+    # 同じになるか。アイテムで増えたボールやゲームオーバーの崩落の途中からのリスタートも含める
+    failures = []
+    for seed in range(3):
+        played = Game(seed=seed)
+        done = 0
+        for stop in (frames // 10, frames // 2, frames):
+            while done < stop:
+                played.update(follow_ball_input(played))
+                done += 1
+            fresh = Game(seed=seed)
+            fresh.rng.setstate(played.rng.getstate())
+            fresh.effects_rng.setstate(played.effects_rng.getstate())
+            fresh.frame_count = played.frame_count
+            played.init_game()
+            fresh.init_game()
+            if reset_state(played) != reset_state(fresh):
+                failures.append(f"seed {seed}: restart after {done} frames differs from a new game")
+            else:
+                frame = lockstep(played, fresh, frames // 10)
+                if frame is not None:
+                    failures.append(f"seed {seed}: restart after {done} frames diverges {frame} frames later")
+    return failures
+
+
+# --- 崩落 -------------------------------------------------------------------
+
+def check_collapse(frames):
+    # 大きな盤面のゲームオーバーの崩落を collapse.py（NumPy）で進めたときと、ブロックごとの
+    # ループで進めたときが同じになるか。崩落で引いた乱数がその後の展開に響くので、リスタートして
+    # 遊び続けるところまで比べる
+    failures = []
+    for seed in range(2):
+        vector = Game(seed=seed, **LARGE_BOARD)
+        loop = Game(seed=seed, **LARGE_BOARD)
+        if vector.update_collapse is None:
+            return ["collapse.py is not in use (numpy is missing)"]
+        loop.update_collapse = None
+        setup_collapse(vector)
+        setup_collapse(loop)
+        frame = lockstep(vector, loop, frames)
+        if frame is not None:
+            failures.append(f"seed {seed}: NumPy collapse and per-block loop differ at frame {frame}")
+    return failures
+
+
+# --- スナップショット -------------------------------------------------------
+
+def branch_from(original, branch, frames):
+    # original のスナップショットを branch に戻し、そこから frames フレーム同じ展開になるかを調べる。
+    # 食い違えばメッセージを返す
+    data = snapshot(original)
+    restore(branch, data)
+    at = original.frame_count
+    if snapshot(branch) != data:
+        return f"restoring frame {at} does not give back the snapshot"
+    frame = lockstep(original, branch, frames)
+    if frame is not None:
+        return f"branch from frame {at} diverges {frame} frames later"
+    return None
+
+
+def check_snapshot(frames):
+    # スナップショットを別の展開をしていたゲームに戻すと、元のゲームと同じ展開を続けるか。
+    # 通常のモードとボールストームのゲームの途中の何か所かと、ゲームオーバーの崩落の途中
+    # （崩落の配列もスナップショットに入る）から枝分かれさせて比べる
+    failures = []
+    for name, options in (('default', {}), ('storm', {'ball_storm': True})):
+        for seed in range(3):
+            original = Game(seed=seed, **options)
+            branch = Game(seed=seed + 100, **options)
+            for _ in range(4):
+                for _ in range(frames // 4):
+                    original.update(follow_ball_input(original))
+                    branch.update(follow_ball_input(branch))
+                failure = branch_from(original, branch, frames // 4)
+                if failure is not None:
+                    failures.append(f"{name} seed {seed}: {failure}")
+    for seed in range(3):
+        original = Game(seed=seed)
+        setup_collapse(original)
+        for _ in range(20):
+            original.update(0)
+        failure = branch_from(original, Game(seed=seed + 100), frames // 4)
+        if failure is not None:
+            failures.append(f"collapse seed {seed}: {failure}")
+    return failures
+
+
+# (名前, 調べる関数, フレーム数)
+CHECKS = [
+    ('grid', check_grid, 3000),
+    ('reset', check_reset, 3000),
+    ('collapse', check_collapse, 600),
+    ('snapshot', check_snapshot, 2000),
+]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check optimized code paths against their reference versions")
+    parser.add_argument('checks', nargs='*', help="checks to run (default: all)")
+    parser.add_argument('--frames-scale', type=float, default=1.0,
+                        help="multiply every check's frame count")
+    args = parser.parse_args(argv)
+
+    selected = [c for c in CHECKS if not args.checks or c[0] in args.checks]
+    failures = []
+    for name, check, frames in selected:
+        found = check(max(1, int(frames * args.frames_scale)))
+        print(f"{name:<12}{'ok' if not found else 'FAILED'}")
+        failures += found
+
+    if failures:
+        print("\nMISMATCH:")
+        for failure in failures:
+            print("  " + failure)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+import math
+
+import numpy as np
+
+# pyxel の描画命令のうちゲームで使うものを NumPy の uint8 配列（1画素 = 色番号）の上で
+# 再現する描画先。座標の丸め方や円・三角形の塗り方は pyxel と同じにしてあり、同じ命令列なら
+# pyxel の画面と1画素も違わない絵になる。ウィンドウがなくても描けるので、描画の速さの計測や
+# 保存しておいた絵との比較（render_check.py）に使う。
+
+IMAGE_COUNT = 3  # pyxel と同じ数・大きさのイメージバンクを持つ
+IMAGE_SIZE = 256
+
+FONT_WIDTH = 4
+FONT_HEIGHT = 6
+# pyxel の組み込みフォント（' ' から '~' まで）。1文字 4x6 画素を上の行から 4bit ずつ並べたもの
+FONT_DATA = (
+    0x000000, 0x444040, 0xAA0000, 0xAEAEA0, 0x6C6C40, 0x824820, 0x4A4AC0, 0x440000,
+    0x244420, 0x844480, 0xA4E4A0, 0x04E400, 0x000480, 0x00E000, 0x000040, 0x224880,
+    0x6AAAC0, 0x4C4440, 0xC248E0, 0xC242C0, 0xAAE220, 0xE8C2C0, 0x68EAE0, 0xE24880,
+    0xEAEAE0, 0xEAE2C0, 0x040400, 0x040480, 0x248420, 0x0E0E00, 0x842480, 0xE24040,
+    0x4AA860, 0x4AEAA0, 0xCACAC0, 0x688860, 0xCAAAC0, 0xE8E8E0, 0xE8E880, 0x68EA60,
+    0xAAEAA0, 0xE444E0, 0x222A40, 0xAACAA0, 0x8888E0, 0xAEEAA0, 0xCAAAA0, 0x4AAA40,
+    0xCAC880, 0x4AAE60, 0xCAECA0, 0x6842C0, 0xE44440, 0xAAAA60, 0xAAAA40, 0xAAEEA0,
+    0xAA4AA0, 0xAA4440, 0xE248E0, 0x644460, 0x884220, 0xC444C0, 0x4A0000, 0x0000E0,
+    0x840000, 0x06AA60, 0x8CAAC0, 0x068860, 0x26AA60, 0x06AC60, 0x24E440, 0x06AE24,
+    0x8CAAA0, 0x404440, 0x2022A4, 0x8ACCA0, 0xC444E0, 0x0EEEA0, 0x0CAAA0, 0x04AA40,
+    0x0CAAC8, 0x06AA62, 0x068880, 0x06C6C0, 0x4E4460, 0x0AAA60, 0x0AAA40, 0x0AAEE0,
+    0x0A44A0, 0x0AA624, 0x0E24E0, 0x64C460, 0x444440, 0xC464C0, 0x6C0000,
+)
+
+_glyphs = None
+_circle_masks = {}
+
+
+def _round(value):
+    # pyxel と同じ丸め（0.5 は 0 から遠い方へ）
+    if value < 0:
+        return -math.floor(0.5 - value)
+    return math.floor(value + 0.5)
+
+
+def _round_array(values):
+    values = np.asarray(values, dtype=np.float64)
+    return (np.sign(values) * np.floor(np.abs(values) + 0.5)).astype(np.intp)
+
+
+def glyphs():
+    # 文字ごとの 6x4 の bool 配列（最初に使うときに作る）
+    global _glyphs
+    if _glyphs is None:
+        bits = np.array(FONT_DATA, dtype=np.uint32)[:, None] >> np.arange(FONT_WIDTH * FONT_HEIGHT - 1, -1, -1)
+        _glyphs = (bits & 1).astype(bool).reshape(len(FONT_DATA), FONT_HEIGHT, FONT_WIDTH)
+    return _glyphs
+
+
+def circle_mask(radius):
+    # 半径 radius（整数）の塗りつぶし円の bool 配列。pyxel と同じく、行ごと・列ごとに
+    # 円周までの幅を四捨五入して、どちらかの内側に入る画素を塗る
+    mask = _circle_masks.get(radius)
+    if mask is None:
+        offsets = np.arange(-radius, radius + 1)
+        reach = np.floor(np.sqrt(radius * radius - offsets * offsets) + 0.5)
+        distance = np.abs(offsets)
+        mask = (distance[None, :] <= reach[:, None]) | (distance[:, None] <= reach[None, :])
+        _circle_masks[radius] = mask
+    return mask
+
+
+class Framebuffer:
+    """pyxel の画面（とイメージバンク）の代わりに使える uint8 の画素配列。
+
+    pixels[y, x] が色番号。cls, rect, pset, circ, tri, text, blt, pal, pget を pyxel と
+    同じ引数で受け付けるので、pyxel モジュールの代わりに DisplayList.submit に渡したり
+    App(gfx=...) の描画先にしたりできる。連続した pset は psets でまとめて塗る。
+    """
+
+    def __init__(self, width, height, images=IMAGE_COUNT):
+        self.width = width
+        self.height = height
+        self.pixels = np.zeros((height, width), dtype=np.uint8)
+        self.frame_count = 0
+        # 色の置き換え表（pal）
+        self.palette = np.arange(256, dtype=np.uint8)
+        self.images = [Framebuffer(IMAGE_SIZE, IMAGE_SIZE, 0) for _ in range(images)]
+
+    def data_ptr(self):
+        # pyxel.Image.data_ptr の代わり。np.frombuffer で画素をそのまま読み書きできる
+        return self.pixels
+
+    def pget(self, x, y):
+        return int(self.pixels[y, x])
+
+    def pal(self, col1=None, col2=None):
+        if col1 is None:
+            self.palette[:] = np.arange(256, dtype=np.uint8)
+        else:
+            self.palette[col1] = col2
+
+    def cls(self, col):
+        self.pixels[:] = self.palette[col]
+
+    def _fill(self, left, top, right, bottom, col):
+        # [left, right) x [top, bottom) を画面内に切り詰めて塗る
+        left = max(left, 0)
+        top = max(top, 0)
+        right = min(right, self.width)
+        bottom = min(bottom, self.height)
+        if left < right and top < bottom:
+            self.pixels[top:bottom, left:right] = self.palette[col]
+
+    def rect(self, x, y, w, h, col):
+        left = _round(x)
+        top = _round(y)
+        self._fill(left, top, left + _round(w), top + _round(h), col)
+
+    def pset(self, x, y, col):
+        x = _round(x)
+        y = _round(y)
+        if 0 <= x < self.width and 0 <= y < self.height:
+            self.pixels[y, x] = self.palette[col]
+
+    def psets(self, xs, ys, colors):
+        # pset を続けて呼んだのと同じ（同じ画素に何度も打つときは最後の色が残る）
+        xs = _round_array(xs)
+        ys = _round_array(ys)
+        colors = self.palette[np.asarray(colors, dtype=np.intp)]
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        self.pixels[ys[inside], xs[inside]] = colors[inside]
+
+    def _paste(self, x, y, mask, values):
+        # mask が True の画素に values（色番号の配列か1色）を (x, y) を左上にして書く
+        h, w = mask.shape
+        left = max(x, 0)
+        top = max(y, 0)
+        right = min(x + w, self.width)
+        bottom = min(y + h, self.height)
+        if left >= right or top >= bottom:
+            return
+        mask = mask[top - y:bottom - y, left - x:right - x]
+        if not np.isscalar(values):
+            values = values[top - y:bottom - y, left - x:right - x][mask]
+        self.pixels[top:bottom, left:right][mask] = values
+
+    def circ(self, x, y, r, col):
+        radius = max(_round(r), 0)
+        x = _round(x)
+        y = _round(y)
+        self._paste(x - radius, y - radius, circle_mask(radius), self.palette[col])
+
+    def tri(self, x1, y1, x2, y2, x3, y3, col):
+        # pyxel と同じ塗り方: 頂点を丸めて y の順に並べ（同じ y なら渡された順）、真ん中の
+        # 頂点の高さで長い辺との交点を丸めて求め、どの辺の x もその高さから測る。どちらが左かは
+        # 交点と真ん中の頂点で1回だけ決めるので、左右が入れ替わる行は描かれない。
+        # 辺の x は pyxel に合わせて float32 で計算する（0.5 ちょうど付近の丸めが変わるため）
+        x1, y1, x2, y2, x3, y3 = _round(x1), _round(y1), _round(x2), _round(y2), _round(x3), _round(y3)
+        if y1 > y2:
+            x1, y1, x2, y2 = x2, y2, x1, y1
+        if y1 > y3:
+            x1, y1, x3, y3 = x3, y3, x1, y1
+        if y2 > y3:
+            x2, y2, x3, y3 = x3, y3, x2, y2
+        top = max(y1, 0)
+        bottom = min(y3, self.height - 1)
+        if top > bottom:
+            return
+        if y1 == y3:
+            # 横一直線の三角形は端から端まで
+            self._fill(min(x1, x2, x3), y1, max(x1, x2, x3) + 1, y1 + 1, col)
+            return
+        f32 = np.float32
+        slope12 = f32(x2 - x1) / f32(y2 - y1) if y2 != y1 else f32(0)
+        slope13 = f32(x3 - x1) / f32(y3 - y1) if y3 != y1 else f32(0)
+        slope23 = f32(x3 - x2) / f32(y3 - y2) if y3 != y2 else f32(0)
+        x_inter = _round(float(f32(x1) + slope13 * f32(y2 - y1)))
+        rows = np.arange(top, bottom + 1)
+        long_x = _round_array(f32(x_inter) + slope13 * (rows - y2).astype(f32))
+        short_x = _round_array(f32(x2) + np.where(rows < y2, slope12, slope23) * (rows - y2).astype(f32))
+        if x_inter < x2:
+            lefts, rights = long_x, short_x
+        else:
+            lefts, rights = short_x, long_x
+        lefts = np.maximum(lefts, 0).tolist()
+        rights = np.minimum(rights, self.width - 1).tolist()
+        color = self.palette[col]
+        pixels = self.pixels
+        for y, left, right in zip(range(top, bottom + 1), lefts, rights):
+            if left <= right:
+                pixels[y, left:right + 1] = color
+
+    def text(self, x, y, s, col):
+        x = _round(x)
+        y = _round(y)
+        color = self.palette[col]
+        font = glyphs()
+        start_x = x
+        for ch in s:
+            if ch == "\n":
+                x = start_x
+                y += FONT_HEIGHT
+                continue
+            code = ord(ch) - 32
+            if 0 <= code < len(font):
+                self._paste(x, y, font[code], color)
+            x += FONT_WIDTH
+
+    def blt(self, x, y, img, u, v, w, h, colkey=None):
+        # 幅・高さが負なら左右・上下を反転する。colkey の色は透明、残りは pal で置き換える
+        source = self.images[img].pixels if isinstance(img, int) else img.pixels
+        x = _round(x)
+        y = _round(y)
+        u = _round(u)
+        v = _round(v)
+        w = _round(w)
+        h = _round(h)
+        region = source[v:v + abs(h), u:u + abs(w)]
+        if w < 0:
+            region = region[:, ::-1]
+        if h < 0:
+            region = region[::-1, :]
+        if colkey is None:
+            mask = np.ones(region.shape, dtype=bool)
+        else:
+            mask = region != colkey
+        self._paste(x, y, mask, self.palette[region])
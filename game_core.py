@@ -0,0 +1,1064 @@
+import math
+import random
+import sys
+import time
+from array import array
+
+from geometry import DEG_TO_RAD, explosion_easing
+from levels import default_level
+from profiler import NULL_PROFILER
+
+WIDTH = 160
+HEIGHT = 120
+FPS = 30
+
+# 1フレーム分の入力（ビットフラグ）
+BTN_LEFT = 1
+BTN_RIGHT = 2
+BTN_RESTART = 4
+
+
+MAX_PARTICLES = 4096
+PARTICLE_LIFE = 30
+EFFECTS_SEED = 0x5EED  # 演出用の乱数の seed は seed ^ EFFECTS_SEED
+VECTOR_COLLAPSE_BLOCKS = 128  # これ以上ブロックがある盤面の崩落は collapse.py（NumPy）でまとめて進める
+VECTOR_PARTICLES = 128  # これ以上パーティクルがあれば particles.py（NumPy）でまとめて進める
+MAX_EXPLOSIONS = 512
+
+
+class ParticlePool:
+    """パーティクルを要素ごとの配列で持つ固定容量のプール。1粒ずつオブジェクトを作らない。"""
+
+    def __init__(self, capacity=MAX_PARTICLES):
+        self.capacity = capacity
+        self.count = 0
+        # 要素ごとの配列は最初に発生させるときに確保する（起動直後は使わないので）
+        self.x = self.y = self.dx = self.dy = self.life = self.color = []
+        # 粒が多いときにまとめて進める関数（particles.update_particles。Game が NumPy を使うときに入れる）
+        self.update_vector = None
+
+    def allocate(self):
+        # Board と同じく値を箱に入れずに持つ配列にする（NumPy からはコピーなしのビューで扱える）
+        capacity = self.capacity
+        self.x = array('d', bytes(8 * capacity))
+        self.y = array('d', bytes(8 * capacity))
+        self.dx = array('d', bytes(8 * capacity))
+        self.dy = array('d', bytes(8 * capacity))
+        self.life = array('i', bytes(array('i').itemsize * capacity))
+        self.color = array('B', bytes(capacity))
+
+    def clear(self):
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def spawn(self, rng, x, y, width, height, color, num_particles, life=PARTICLE_LIFE):
+        # (x, y) から幅 width, 高さ height の範囲にまとめて発生させる。容量を超えた分は捨てる
+        if not self.x:
+            self.allocate()
+        num_particles = min(num_particles, self.capacity - self.count)
+        uniform = rng.uniform
+        cos = math.cos
+        sin = math.sin
+        tau = math.pi * 2
+        i = self.count
+        for _ in range(num_particles):
+            self.x[i] = x + uniform(0, width)
+            self.y[i] = y + uniform(0, height)
+            angle = uniform(0, tau)
+            speed = uniform(1.5, 4.0)
+            self.dx[i] = cos(angle) * speed
+            self.dy[i] = sin(angle) * speed
+            self.life[i] = life
+            self.color[i] = color
+            i += 1
+        self.count = i
+
+    def update(self):
+        # 移動と寿命の更新をしながら、生きている粒を前に詰める（順番は変わらない）
+        if self.count >= VECTOR_PARTICLES and self.update_vector is not None:
+            self.update_vector(self)
+            return
+        xs, ys, dxs, dys, lifes, colors = self.x, self.y, self.dx, self.dy, self.life, self.color
+        alive = 0
+        for i in range(self.count):
+            life = lifes[i] - 1
+            if life > 0:
+                xs[alive] = xs[i] + dxs[i]
+                ys[alive] = ys[i] + dys[i]
+                dxs[alive] = dxs[i]
+                dys[alive] = dys[i]
+                lifes[alive] = life
+                colors[alive] = colors[i]
+                alive += 1
+        self.count = alive
+
+
+class ExplosionPool:
+    """爆発エフェクトの固定容量プール。"""
+
+    max_life = 8
+    easing = explosion_easing(max_life)
+
+    def __init__(self, capacity=MAX_EXPLOSIONS):
+        self.capacity = capacity
+        self.count = 0
+        # ParticlePool と同じく最初の爆発のときに確保する
+        self.x = self.y = self.combo = self.life = self.max_radius = []
+
+    def allocate(self):
+        capacity = self.capacity
+        self.x = [0.0] * capacity
+        self.y = [0.0] * capacity
+        self.combo = [0] * capacity
+        self.life = [0] * capacity
+        self.max_radius = [0] * capacity
+
+    def clear(self):
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def spawn(self, x, y, combo):
+        if self.count >= self.capacity:
+            return
+        if not self.x:
+            self.allocate()
+        i = self.count
+        self.x[i] = x
+        self.y[i] = y
+        self.combo[i] = combo
+        self.life[i] = self.max_life
+        base_radius = 12
+        combo_bonus = combo * 6
+        self.max_radius[i] = min(base_radius + combo_bonus, 60)
+        self.count = i + 1
+
+    def update(self):
+        xs, ys, combos, lifes, radii = self.x, self.y, self.combo, self.life, self.max_radius
+        alive = 0
+        for i in range(self.count):
+            life = lifes[i] - 1
+            if life > 0:
+                xs[alive] = xs[i]
+                ys[alive] = ys[i]
+                combos[alive] = combos[i]
+                lifes[alive] = life
+                radii[alive] = radii[i]
+                alive += 1
+        self.count = alive
+
+    def get_current_radius(self, i):
+        return self.max_radius[i] * self.easing[self.life[i]]
+
+
+# イベントの種類
+EVENT_BLOCK = 1  # ブロックが壊れた（value: ブロック番号、combo: その時点のコンボ数、x, y: ブロックの中心）
+EVENT_COMBO = 2  # 2コンボ以上になった（value: コンボ数、x, y: ボールの位置）
+
+
+class EventQueue:
+    """1フレームの間に起きたイベントを要素ごとのリストで持つキュー。
+
+    当たり判定はイベントを積むだけで、爆発やパーティクルなどの演出は Game.apply_effects が
+    フレームの最後にまとめて処理する。毎フレームの最初に空になる。
+    """
+
+    def __init__(self, capacity=64):
+        self.count = 0
+        self.kind = [0] * capacity
+        self.value = [0] * capacity
+        self.combo = [0] * capacity
+        self.x = [0.0] * capacity
+        self.y = [0.0] * capacity
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.count = 0
+
+    def push(self, kind, value, combo, x, y):
+        # 容量を超えたら倍に広げる（イベントは捨てない）
+        i = self.count
+        if i == len(self.kind):
+            for field in (self.kind, self.value, self.combo, self.x, self.y):
+                field.extend(field)
+        self.kind[i] = kind
+        self.value[i] = value
+        self.combo[i] = combo
+        self.x[i] = x
+        self.y[i] = y
+        self.count = i + 1
+
+
+class Trail:
+    """残像用の固定容量リングバッファ。満杯なら一番古い位置を上書きする。
+
+    番号 0 が一番新しい位置。slot(i) で xs/ys の添字に変換する。
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.xs = [0.0] * capacity
+        self.ys = [0.0] * capacity
+        self.head = 0  # 次に書き込む位置
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.head = 0
+        self.count = 0
+
+    def push(self, x, y=0.0):
+        head = self.head
+        self.xs[head] = x
+        self.ys[head] = y
+        head += 1
+        self.head = 0 if head == self.capacity else head
+        if self.count < self.capacity:
+            self.count += 1
+
+    def drop_oldest(self):
+        if self.count > 0:
+            self.count -= 1
+
+    def slot(self, i):
+        return (self.head - 1 - i) % self.capacity
+
+
+BALL_SPEED = 2
+BALL_SIZE = 2
+PADDLE_SPEED = 4  # ボタン操作で1フレームに動くパドルの距離
+STORM_BALLS_PER_ITEM = 64  # ボールストームモードでアイテム1個から増えるボールの数
+MAX_BOUNCES = 8  # 1フレーム中に解決する跳ね返りの上限
+
+
+def sweep_box(x, y, dx, dy, size, left, top, width, height):
+    # 大きさ size の正方形を (dx, dy) だけ動かしたとき、矩形に最初に触れる時刻 t (0..1) と
+    # 当たった面の軸 ('x' か 'y') を返す。当たらなければ None
+    # 矩形をボールの大きさだけ広げて、ボールの左上の点の線分との交差として調べる
+    x0 = left - size
+    x1 = left + width
+    y0 = top - size
+    y1 = top + height
+    if dx > 0:
+        tx_enter = (x0 - x) / dx
+        tx_exit = (x1 - x) / dx
+    elif dx < 0:
+        tx_enter = (x1 - x) / dx
+        tx_exit = (x0 - x) / dx
+    elif x0 < x < x1:
+        tx_enter = -math.inf
+        tx_exit = math.inf
+    else:
+        return None
+    if dy > 0:
+        ty_enter = (y0 - y) / dy
+        ty_exit = (y1 - y) / dy
+    elif dy < 0:
+        ty_enter = (y1 - y) / dy
+        ty_exit = (y0 - y) / dy
+    elif y0 < y < y1:
+        ty_enter = -math.inf
+        ty_exit = math.inf
+    else:
+        return None
+
+    t_enter = max(tx_enter, ty_enter)
+    t_exit = min(tx_exit, ty_exit)
+    if t_enter >= t_exit or t_exit <= 0 or t_enter > 1:
+        return None
+    if t_enter < 0:
+        # すでに重なっている場合はその場で当たったことにする
+        return 0.0, 'y'
+    return t_enter, 'x' if tx_enter > ty_enter else 'y'
+
+
+class Ball:
+    def __init__(self, x, y, rng, speed=BALL_SPEED, max_trail=8):
+        self.size = BALL_SIZE
+        self.max_trail = max_trail
+        self.trail = Trail(max_trail)
+        # 連続衝突判定のときにこのフレームで当たったブロック番号（当たった順）
+        self.swept_hits = []
+        self.reset(x, y, rng, speed)
+
+    def reset(self, x, y, rng, speed=BALL_SPEED):
+        # 新しく作ったときと同じ状態に戻す（使い終わったボールを使い回すため）
+        self.x = x
+        self.y = y
+        angle = rng.uniform(-60, 60)
+        self.dx = speed * math.sin(angle * DEG_TO_RAD)
+        self.dy = -speed * math.cos(angle * DEG_TO_RAD)
+        self.trail.clear()
+        self.swept_hits.clear()
+
+    def update(self, game):
+        self.trail.push(self.x, self.y)
+
+        if game.swept_collision:
+            self.sweep(game)
+            return
+
+        next_x = self.x + self.dx
+        next_y = self.y + self.dy
+
+        if next_x < 0:
+            self.x = 0
+            self.dx = abs(self.dx)
+        elif next_x > game.width - self.size:
+            self.x = game.width - self.size
+            self.dx = -abs(self.dx)
+        else:
+            self.x = next_x
+
+        if next_y < 0:
+            self.y = 0
+            self.dy = abs(self.dy)
+        else:
+            self.y = next_y
+
+        if (self.y + self.size > game.paddle_y and
+            self.x + self.size > game.paddle_x and
+            self.x < game.paddle_x + game.paddle_width):
+            self.bounce_on_paddle(game)
+
+    def bounce_on_paddle(self, game):
+        relative_intersect_x = (game.paddle_x + (game.paddle_width / 2)) - self.x
+        normalized_intersect = relative_intersect_x / (game.paddle_width / 2)
+        bounce_angle = normalized_intersect * 60
+
+        speed = math.sqrt(self.dx ** 2 + self.dy ** 2)
+        self.dx = -speed * math.sin(bounce_angle * DEG_TO_RAD)
+        self.dy = -speed * math.cos(bounce_angle * DEG_TO_RAD)
+
+        self.y = game.paddle_y - self.size
+
+    def sweep(self, game):
+        # 移動の線分に沿って一番早く当たるもの（壁・パドル・ブロック）を探し、
+        # そこで跳ね返して残りの時間ぶん進む、を繰り返す。速くてもすり抜けない
+        hits = self.swept_hits
+        del hits[:]
+        blocks = game.blocks
+        size = self.size
+        remaining = 1.0
+        for _ in range(MAX_BOUNCES):
+            dx = self.dx * remaining
+            dy = self.dy * remaining
+            best_t = 1.0
+            best = None
+
+            if dx < 0 and self.x + dx < 0:
+                best_t, best = -self.x / dx, 'left'
+            elif dx > 0 and self.x + dx > game.width - size:
+                best_t, best = (game.width - size - self.x) / dx, 'right'
+            if dy < 0 and self.y + dy < 0:
+                t = -self.y / dy
+                if t < best_t:
+                    best_t, best = t, 'top'
+
+            if dy > 0:
+                hit = sweep_box(self.x, self.y, dx, dy, size,
+                                game.paddle_x, game.paddle_y, game.paddle_width, game.paddle_height)
+                if hit is not None and hit[0] < best_t:
+                    best_t, best = hit[0], 'paddle'
+
+            # 移動範囲に掛かるセルのブロックだけを調べる
+            query_x = min(self.x, self.x + dx)
+            query_y = min(self.y, self.y + dy)
+            for i in game.block_grid.query(query_x, query_y, abs(dx) + size, abs(dy) + size):
+                if not blocks.active[i] or i in hits:
+                    continue
+                hit = sweep_box(self.x, self.y, dx, dy, size,
+                                blocks.x[i], blocks.y[i], game.block_width, game.block_height)
+                if hit is not None and hit[0] < best_t:
+                    best_t, best = hit[0], (i, hit[1])
+
+            self.x += dx * best_t
+            self.y += dy * best_t
+            remaining *= 1.0 - best_t
+            if best is None:
+                break
+            if best == 'left':
+                self.x = 0
+                self.dx = abs(self.dx)
+            elif best == 'right':
+                self.x = game.width - size
+                self.dx = -abs(self.dx)
+            elif best == 'top':
+                self.y = 0
+                self.dy = abs(self.dy)
+            elif best == 'paddle':
+                self.bounce_on_paddle(game)
+            else:
+                index, axis = best
+                hits.append(index)
+                if axis == 'x':
+                    self.dx *= -1
+                else:
+                    self.dy *= -1
+            if remaining <= 0:
+                break
+
+
+class Item:
+    def __init__(self, x, y):
+        self.size = 4
+        self.speed = 1
+        self.reset(x, y)
+
+    def reset(self, x, y):
+        self.x = x
+        self.y = y
+        self.active = True
+
+    def update(self, game):
+        self.y += self.speed
+        return self.y < game.height
+
+
+class Board:
+    """ブロックを項目ごとの配列で持つ盤面。生きているブロック数を数えておくのでクリア判定は O(1)。"""
+
+    def __init__(self, block_width, block_height):
+        self.block_width = block_width
+        self.block_height = block_height
+        self.x = array('d')
+        self.y = array('d')
+        self.color = array('B')
+        self.active = bytearray()
+        self.fall_speed = array('d')
+        self.rotation = array('d')
+        self.rotate_speed = array('d')
+        self.fall_delay = array('i')
+        self.horizontal_speed = array('d')
+        self.live = 0
+        # 盤面を作り直すたびに増える。描画側のキャッシュが古くなったかどうかの判定に使う
+        self.version = 0
+
+    def __len__(self):
+        return len(self.active)
+
+    def load(self, level):
+        # Level の内容で盤面を作り直す。配列ごとの一括コピーなのでブロック数が多くても速い
+        n = len(level)
+        self.block_width = level.block_width
+        self.block_height = level.block_height
+        self.x[:] = level.x
+        self.y[:] = level.y
+        self.color[:] = level.color
+        self.active[:] = level.ones()
+        zeros = level.zeros('d')
+        self.fall_speed[:] = zeros
+        self.rotation[:] = zeros
+        self.rotate_speed[:] = zeros
+        self.horizontal_speed[:] = zeros
+        self.fall_delay[:] = level.zeros('i')
+        self.live = n
+        self.version += 1
+
+    def deactivate(self, index):
+        if self.active[index]:
+            self.active[index] = 0
+            self.live -= 1
+
+
+class BlockGrid:
+    """ブロックを一定サイズのセルに登録しておき、ボールの周りのセルだけを調べるための索引。"""
+
+    def __init__(self, cell_width, cell_height):
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+        self.cells = {}
+        self.template = None  # 最後に load した雛形
+        self.found = []  # query の結果
+
+    def cell_range(self, x, y, width, height):
+        col0 = int(x // self.cell_width)
+        col1 = int((x + width) // self.cell_width)
+        row0 = int(y // self.cell_height)
+        row1 = int((y + height) // self.cell_height)
+        for row in range(row0, row1 + 1):
+            for col in range(col0, col1 + 1):
+                yield (col, row)
+
+    def load(self, cells):
+        # 登録済みの雛形（セル -> ブロック番号のリスト）を使う。リストは雛形と共有するので、
+        # remove はリストを書き換えずに差し替える。remove はセルを消さずに空にするので、同じ雛形なら
+        # キーは雛形と同じまま残っている。そのときは dict を作り直さず、値だけ入れ直す
+        grid = self.cells
+        if self.template is not cells or len(grid) != len(cells):
+            self.cells = dict(cells)
+            self.template = cells
+            return
+        for key, indices in cells.items():
+            grid[key] = indices
+
+    def remove(self, index, x, y, width, height):
+        for key in self.cell_range(x, y, width, height):
+            cell = self.cells.get(key)
+            if cell is not None and index in cell:
+                self.cells[key] = [i for i in cell if i != index]
+
+    def query(self, x, y, width, height):
+        # 線形走査と同じ順番で当たり判定できるよう、番号順に並べて返す。返す list は毎フレーム
+        # 作らずに使い回すので、次に query を呼ぶ前に使い終えること
+        found = self.found
+        found.clear()
+        cells = self.cells
+        col0 = int(x // self.cell_width)
+        col1 = int((x + width) // self.cell_width)
+        row0 = int(y // self.cell_height)
+        row1 = int((y + height) // self.cell_height)
+        # range を作らないよう while で回す
+        row = row0
+        while row <= row1:
+            col = col0
+            while col <= col1:
+                cell = cells.get((col, row))
+                if cell:
+                    for i in cell:
+                        if i not in found:
+                            found.append(i)
+                col += 1
+            row += 1
+        found.sort()
+        return found
+
+
+class Game:
+    """ゲームロジック本体。pyxel に依存しないので、ウィンドウなしで何フレームでも回せる。"""
+
+    def __init__(self, width=WIDTH, height=HEIGHT, seed=None, ball_speed=BALL_SPEED, swept_collision=None,
+                 ball_storm=False, level=None, effects=True, vector_particles=True):
+        self.width = width
+        self.height = height
+        # 通常速度より速いボールは連続衝突判定で動かす（1フレームで何ピクセル進んでもすり抜けない）
+        self.ball_speed = ball_speed
+        if swept_collision is None:
+            swept_collision = ball_speed > BALL_SPEED
+        self.swept_collision = swept_collision
+        # バランス調整用の値（balance.py で振って試せる）
+        self.item_drop_rate = 0.08
+        self.max_combo_timer = 30  # 次のブロックを壊すまでコンボが続くフレーム数
+        self.combo_bonus_per_combo = 0.1  # 2コンボ以上で1コンボごとに縮むクリア時間（秒）
+        self.ball_bonus_per_ball = 1  # クリア時に2個目以降のボール1個ごとに縮むクリア時間（秒）
+        # ボールストームモード: ボールを NumPy 配列でまとめて持ち、何千個でも一括で更新する
+        # （numpy が必要。連続衝突判定と残像は使わない）
+        self.ball_storm = ball_storm
+        if ball_storm:
+            from ball_storm import BallStorm
+            self.balls = BallStorm()
+        else:
+            self.balls = []
+        # 乱数は全てゲームごとの rng から取る。seed を覚えておけば同じ入力で同じ展開を再現できる。
+        # パーティクルと画面揺れは effects_rng から取り、演出の量を変えても展開は変わらない
+        if seed is None:
+            seed = random.getrandbits(32)
+        self.rng = random.Random()
+        self.effects_rng = random.Random()
+        self.reseed(seed)
+        # 演出の量（1.0 が通常）。quality.QualityGovernor が処理の重さに合わせて変える
+        self.effect_scale = 1.0
+        # effects=False ならイベントを積まず演出も作らない（ウィンドウなしで回すとき用。展開は同じ）
+        self.effects = effects
+        self.events = EventQueue()
+        self.hits = []  # check_collisions でボール1個が当たったブロック（毎回中身を入れ替えて使う）
+        self.frame_count = 0
+        # 盤面は Level から作る（None なら元の 5x14 の盤面）。解析結果はリスタートでも使い回す
+        if level is None:
+            level = default_level()
+        self.level = level
+        self.block_width = level.block_width
+        self.block_height = level.block_height
+        self.blocks = Board(self.block_width, self.block_height)
+        self.update_collapse = None
+        if len(level) >= VECTOR_COLLAPSE_BLOCKS:
+            try:
+                from collapse import update_collapse
+                self.update_collapse = update_collapse
+            except ImportError:  # numpy がなければブロックごとのループで進める
+                pass
+        self.block_grid = BlockGrid(self.block_width, self.block_height)
+        self.particles = ParticlePool()
+        # vector_particles なら NumPy があれば多数のパーティクルを particles.py でまとめて進める。
+        # NumPy の読み込みは重いので、起動を速くしたい pyxel の画面では False にする
+        if effects and vector_particles:
+            try:
+                from particles import update_particles
+                self.particles.update_vector = update_particles
+            except ImportError:  # numpy がなければ1粒ずつのループで進める
+                pass
+        self.explosion_effects = ExplosionPool()
+        # リスタートで作り直さず中身だけ戻すもの。画面外に出たボールとアイテムは spare_* に
+        # 取っておき、次に出すときに reset して使い回す
+        self.spare_balls = []
+        self.items = []
+        self.spare_items = []
+        self.paddle_trail = None
+        self.screen_shake = {}
+        self.combo_text = {}
+        # 区間ごとの処理時間を計測するときは profiler.FrameProfiler を入れる
+        self.profiler = NULL_PROFILER
+        self.init_game()
+
+    def reseed(self, seed):
+        self.seed = seed
+        self.rng.seed(seed)
+        self.effects_rng.seed(seed ^ EFFECTS_SEED)
+
+    def init_game(self):
+        self.paddle_x = 80
+        self.paddle_width = 24
+        self.paddle_height = 2
+        self.paddle_y = 110
+        self.max_paddle_trail = 4
+        if self.paddle_trail is None or self.paddle_trail.capacity != self.max_paddle_trail:
+            self.paddle_trail = Trail(self.max_paddle_trail)
+        else:
+            self.paddle_trail.clear()
+        self.paddle_opacity = 1.0
+        self.paddle_exit_started = False
+        self.paddle_exit_speed = 0
+
+        if self.ball_storm:
+            self.balls.clear()
+            self.balls.add(80, 90, self.rng, self.ball_speed)
+        else:
+            self.spare_balls.extend(self.balls)
+            self.balls.clear()
+            self.balls.append(self.new_ball(80, 90))
+
+        self.blocks.load(self.level)
+        self.block_grid.load(self.level.grid_cells(self.block_grid))
+
+        self.events.clear()
+        self.particles.clear()
+        self.spare_items.extend(self.items)
+        self.items.clear()
+        self.game_cleared = False
+        self.game_over = False
+        self.game_over_timer = 0
+        self.clear_message_y = 60
+        self.start_frame = self.frame_count
+        self.clear_time = 0
+        self.bonus_time = 0
+        self.ball_bonus = 0
+        self.combo_bonus = 0
+        self.total_combo_bonus = 0  # 累積コンボボーナスを追加
+
+        self.current_combo = 0
+        self.max_combo = 0  # 最大コンボ数を記録
+        self.combo_timer = 0
+        screen_shake = self.screen_shake
+        screen_shake['x'] = 0
+        screen_shake['y'] = 0
+        screen_shake['duration'] = 0
+        screen_shake['magnitude'] = 0
+        combo_text = self.combo_text
+        combo_text['text'] = ''
+        combo_text['x'] = 0
+        combo_text['y'] = 0
+        combo_text['timer'] = 0
+        self.explosion_effects.clear()
+
+    def update(self, buttons=0, touch_x=None):
+        # buttons: BTN_* のビットフラグ、touch_x: タッチ中の x 座標（タッチしていなければ None）
+        self.frame_count += 1
+        self.events.clear()
+
+        if self.game_cleared:
+            if buttons & BTN_RESTART:
+                self.init_game()
+            return
+
+        profiler = self.profiler
+        if self.game_over:
+            self.update_game_over()
+            profiler.mark('game_over')
+            if buttons & BTN_RESTART:
+                self.init_game()
+            return
+
+        self.update_paddle(buttons, touch_x)
+        profiler.mark('paddle')
+
+        if self.combo_timer > 0:
+            self.combo_timer -= 1
+        elif self.current_combo > 0:
+            self.current_combo = 0
+
+        self.update_screen_shake()
+
+        # コンボ表示は1フレーム表示するごとに減らす
+        if self.combo_text['timer'] > 0:
+            self.combo_text['timer'] -= 1
+
+        self.explosion_effects.update()
+        profiler.mark('explosions')
+
+        if self.ball_storm:
+            self.balls.update(self)
+        else:
+            # 落ちたボールを抜いて残りを前に詰める（リストは作り直さない）
+            balls = self.balls
+            alive = 0
+            for ball in balls:
+                ball.update(self)
+                if ball.y < self.height:
+                    balls[alive] = ball
+                    alive += 1
+                else:
+                    self.spare_balls.append(ball)
+            if alive < len(balls):
+                del balls[alive:]
+        profiler.mark('balls')
+
+        if not self.balls:
+            self.start_game_over()
+            return
+
+        self.check_collisions()
+        profiler.mark('collisions')
+        if self.events.count:
+            self.apply_effects()
+            profiler.mark('effects')
+        self.particles.update()
+        profiler.mark('particles')
+
+        items = self.items
+        alive = 0
+        for item in items:
+            if item.active and item.update(self):
+                if (item.y + item.size > self.paddle_y and
+                    item.x + item.size > self.paddle_x and
+                    item.x < self.paddle_x + self.paddle_width):
+                    item.active = False
+                    self.add_new_ball()
+                if item.active:
+                    items[alive] = item
+                    alive += 1
+                    continue
+            self.spare_items.append(item)
+        if alive < len(items):
+            del items[alive:]
+        profiler.mark('items')
+
+        if self.blocks.live == 0:
+            if not self.game_cleared:
+                # 経過時間は実時間ではなくフレーム数から計算する
+                self.clear_time = (self.frame_count - self.start_frame) / FPS
+                # 複数ボールのボーナス
+                remaining_balls = len(self.balls)
+                if remaining_balls > 1:
+                    self.ball_bonus = (remaining_balls - 1) * self.ball_bonus_per_ball
+                else:
+                    self.ball_bonus = 0
+                # 合計ボーナスを計算して適用
+                self.combo_bonus = self.total_combo_bonus
+                self.bonus_time = self.ball_bonus + self.combo_bonus
+                self.clear_time = max(0, self.clear_time - self.bonus_time)
+            self.game_cleared = True
+
+    def update_screen_shake(self):
+        if self.screen_shake['duration'] > 0:
+            magnitude = self.screen_shake['magnitude']
+            if magnitude < 1:
+                shake = 1 if self.effects_rng.random() < magnitude else 0
+            else:
+                shake = self.effects_rng.randint(-int(magnitude), int(magnitude))
+            self.screen_shake['x'] = shake
+            self.screen_shake['y'] = shake
+            self.screen_shake['duration'] -= 1
+        else:
+            self.screen_shake['x'] = 0
+            self.screen_shake['y'] = 0
+            self.screen_shake['magnitude'] = 0
+
+    def add_screen_shake(self, combo):
+        if combo >= 2:
+            if combo == 2:
+                magnitude = 0.5
+                duration = 1
+            elif combo == 3:
+                magnitude = 1
+                duration = 3
+            elif combo == 4:
+                magnitude = 2
+                duration = 5
+            else:
+                magnitude = 3
+                duration = 8
+
+            self.screen_shake['magnitude'] = magnitude
+            self.screen_shake['duration'] = duration
+
+    def start_game_over(self):
+        self.game_over = True
+        self.game_over_timer = 0
+        self.screen_shake['magnitude'] = 3
+        self.screen_shake['duration'] = 8
+
+        self.paddle_exit_started = True
+        self.paddle_exit_speed = 1
+
+        blocks = self.blocks
+        for i in range(len(blocks)):
+            if blocks.active[i]:
+                blocks.fall_speed[i] = self.rng.uniform(2.0, 4.0)
+                if self.rng.random() < 0.3:
+                    blocks.rotate_speed[i] = self.rng.uniform(-15, 15)
+                blocks.fall_delay[i] = self.rng.randint(0, 20)
+                if self.rng.random() < 0.5:
+                    blocks.horizontal_speed[i] = self.rng.uniform(-1.5, 1.5)
+
+    def update_game_over(self):
+        self.game_over_timer += 1
+
+        if self.screen_shake['duration'] > 0:
+            magnitude = self.screen_shake['magnitude']
+            self.screen_shake['x'] = self.effects_rng.randint(-magnitude, magnitude)
+            self.screen_shake['y'] = self.effects_rng.randint(-magnitude, magnitude)
+            self.screen_shake['duration'] -= 1
+        else:
+            self.screen_shake['x'] = 0
+            self.screen_shake['y'] = 0
+            self.screen_shake['magnitude'] = 0
+
+        if self.update_collapse is not None:
+            self.update_collapse(self)
+        else:
+            self.update_collapse_blocks()
+
+        if self.paddle_exit_started:
+            self.paddle_exit_speed *= 1.1
+            self.paddle_x += self.paddle_exit_speed
+            self.paddle_opacity = max(0, self.paddle_opacity - 0.05)
+
+    def update_collapse_blocks(self):
+        blocks = self.blocks
+        for i in range(len(blocks)):
+            if blocks.active[i]:
+                if blocks.fall_delay[i] > 0:
+                    blocks.fall_delay[i] -= 1
+                    continue
+
+                blocks.fall_speed[i] += self.rng.uniform(0.5, 0.8)
+                blocks.rotation[i] += blocks.rotate_speed[i]
+                blocks.rotate_speed[i] *= 0.995
+                blocks.x[i] += blocks.horizontal_speed[i]
+                blocks.y[i] += blocks.fall_speed[i]
+
+                if (blocks.y[i] > self.height or
+                    blocks.x[i] < -self.block_width * 2 or
+                    blocks.x[i] > self.width + self.block_width * 2):
+                    blocks.deactivate(i)
+
+    def update_paddle(self, buttons, touch_x):
+        last_x = self.paddle_x
+        if touch_x is not None:
+            target_x = touch_x - self.paddle_width / 2
+            dx = (target_x - self.paddle_x) * 0.2
+            self.paddle_x = max(0, min(self.paddle_x + dx, self.width - self.paddle_width))
+        else:
+            if buttons & BTN_RIGHT:
+                self.paddle_x = min(self.paddle_x + PADDLE_SPEED, self.width - self.paddle_width)
+            if buttons & BTN_LEFT:
+                self.paddle_x = max(self.paddle_x - PADDLE_SPEED, 0)
+
+        if abs(self.paddle_x - last_x) > 0.5:
+            self.paddle_trail.push(self.paddle_x)
+        else:
+            self.paddle_trail.drop_oldest()
+
+    def check_collisions(self):
+        if self.ball_storm:
+            self.balls.check_collisions(self)
+            return
+
+        for ball in self.balls:
+            hit_paddle = False
+
+            if (ball.y + ball.size > self.paddle_y and
+                ball.x + ball.size > self.paddle_x and
+                ball.x < self.paddle_x + self.paddle_width):
+                hit_paddle = True
+                self.current_combo = 0
+                self.combo_timer = 0
+
+            blocks = self.blocks
+            if self.swept_collision:
+                # 連続衝突判定ではボールの移動中に当たったブロックがもう分かっていて、反射も済んでいる
+                candidates = ball.swept_hits
+            else:
+                candidates = self.block_grid.query(ball.x, ball.y, ball.size, ball.size)
+            hits = self.hits
+            hits.clear()
+            for i in candidates:
+                if blocks.active[i]:
+                    block_x = blocks.x[i]
+                    block_y = blocks.y[i]
+                    if self.swept_collision or (
+                        ball.x + ball.size > block_x and
+                        ball.x < block_x + self.block_width and
+                        ball.y + ball.size > block_y and
+                        ball.y < block_y + self.block_height):
+                        hits.append(i)
+                        if not self.swept_collision:
+                            ball.dy *= -1
+
+            if hits:
+                self.break_blocks(hits, ball.x, ball.y)
+            elif hit_paddle:
+                self.current_combo = 0
+
+    def break_blocks(self, hits, ball_x, ball_y):
+        # hits のブロックを壊し、アイテムとコンボを処理して演出用のイベントを積む。
+        # (ball_x, ball_y) はコンボ表示の位置
+        blocks = self.blocks
+        blocks_destroyed = 0
+        for i in hits:
+            block_x = blocks.x[i]
+            block_y = blocks.y[i]
+            blocks.deactivate(i)
+            self.block_grid.remove(i, block_x, block_y, self.block_width, self.block_height)
+            blocks_destroyed += 1
+
+            if self.rng.random() < self.item_drop_rate:
+                self.items.append(self.new_item(
+                    block_x + self.block_width/2,
+                    block_y + self.block_height/2
+                ))
+
+        # 現在のコンボ数を更新
+        old_combo = self.current_combo
+        self.current_combo += blocks_destroyed
+
+        # 新しいコンボによるボーナス時間を計算
+        old_bonus = old_combo * self.combo_bonus_per_combo if old_combo >= 2 else 0
+        new_bonus = self.current_combo * self.combo_bonus_per_combo if self.current_combo >= 2 else 0
+        combo_bonus = new_bonus - old_bonus  # 増分のみを加算
+
+        if self.current_combo > self.max_combo:
+            self.max_combo = self.current_combo
+        self.combo_timer = self.max_combo_timer
+
+        # コンボボーナスを累積
+        if self.current_combo >= 2:
+            self.total_combo_bonus += combo_bonus
+
+        if self.effects:
+            events = self.events
+            combo = self.current_combo
+            for i in hits:
+                events.push(EVENT_BLOCK, i, combo,
+                            blocks.x[i] + self.block_width / 2, blocks.y[i] + self.block_height / 2)
+            if combo >= 2:
+                events.push(EVENT_COMBO, combo, combo, ball_x, ball_y)
+
+    def apply_effects(self):
+        # このフレームのイベントから爆発・パーティクル・コンボ表示・画面揺れを作る（積まれた順）
+        events = self.events
+        blocks = self.blocks
+        for k in range(events.count):
+            combo = events.combo[k]
+            pos_x = events.x[k]
+            pos_y = events.y[k]
+            if events.kind[k] == EVENT_BLOCK:
+                self.explosion_effects.spawn(pos_x, pos_y, combo)
+                if combo >= 2:
+                    if combo == 2:
+                        num_particles = 6
+                    elif combo == 3:
+                        num_particles = 10
+                    elif combo == 4:
+                        num_particles = 15
+                    else:
+                        num_particles = combo * 4
+                    self.create_particles(pos_x - self.block_width/2, pos_y - self.block_height/2,
+                                          blocks.color[events.value[k]], num_particles)
+            else:
+                self.combo_text['text'] = f"{combo} COMBO!"
+                self.combo_text['x'] = pos_x - 20
+                self.combo_text['y'] = pos_y - 10
+                self.combo_text['timer'] = 30
+
+                self.add_screen_shake(combo)
+
+    def add_new_ball(self):
+        if self.ball_storm:
+            self.balls.add_copies(self.rng, STORM_BALLS_PER_ITEM)
+        elif self.balls:
+            source_ball = self.rng.choice(self.balls)
+            self.balls.append(self.new_ball(source_ball.x, source_ball.y))
+
+    def new_ball(self, x, y):
+        if self.spare_balls:
+            ball = self.spare_balls.pop()
+            ball.reset(x, y, self.rng, self.ball_speed)
+            return ball
+        return Ball(x, y, self.rng, self.ball_speed)
+
+    def new_item(self, x, y):
+        if self.spare_items:
+            item = self.spare_items.pop()
+            item.reset(x, y)
+            return item
+        return Item(x, y)
+
+    def lowest_ball_center(self):
+        # 一番下にあるボールの中心の x 座標（ボールがなければ None）
+        if self.ball_storm:
+            return self.balls.lowest_center()
+        if not self.balls:
+            return None
+        target = max(self.balls, key=lambda ball: ball.y)
+        return target.x + target.size / 2
+
+    def create_particles(self, x, y, color, num_particles):
+        life = PARTICLE_LIFE
+        if self.effect_scale < 1:
+            num_particles = max(1, int(num_particles * self.effect_scale))
+            life = max(1, int(life * self.effect_scale))
+        self.particles.spawn(self.effects_rng, x, y, self.block_width, self.block_height, color,
+                             num_particles, life)
+
+
+def follow_ball_input(game):
+    # 一番低い位置のボールを追いかける簡単な自動操作
+    # クリア後はすぐに、ゲームオーバー後は崩壊演出を2秒見てから再スタートする
+    if game.game_cleared:
+        return BTN_RESTART
+    if game.game_over:
+        return BTN_RESTART if game.game_over_timer >= 60 else 0
+    target_x = game.lowest_ball_center()
+    if target_x is None:
+        return 0
+    center = game.paddle_x + game.paddle_width / 2
+    if target_x < center - 2:
+        return BTN_LEFT
+    if target_x > center + 2:
+        return BTN_RIGHT
+    return 0
+
+
+def run_headless(frames, policy=follow_ball_input, game=None, seed=None):
+    # ウィンドウなしで指定フレーム数だけゲームを進める
+    if game is None:
+        game = Game(seed=seed)
+    for _ in range(frames):
+        game.update(policy(game))
+    return game
+
+
+if __name__ == "__main__":
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    start = time.perf_counter()
+    run_headless(frames)
+    elapsed = time.perf_counter() - start
+    print(f"{frames} frames in {elapsed:.3f}s ({frames / elapsed:.0f} fps)")
@@ -0,0 +1,83 @@
+import math
+
+# 描画や演出で毎フレーム使う三角関数・イージングの値を、起動時に一度だけ計算しておく表
+
+DEG_TO_RAD = math.pi / 180  # math.radians と同じ値になる
+ANGLE_STEPS = 360  # 回転ブロックの角度の刻み（1度単位）
+
+_ring_offsets = {}
+_easing_tables = {}
+_quad_tables = {}
+
+
+def ring_offsets(num_points):
+    # 円周を num_points 等分した点の単位ベクトル (cos, sin) の列
+    offsets = _ring_offsets.get(num_points)
+    if offsets is None:
+        offsets = []
+        for i in range(num_points):
+            angle = (i / num_points) * math.pi * 2
+            offsets.append((math.cos(angle), math.sin(angle)))
+        offsets = _ring_offsets[num_points] = tuple(offsets)
+    return offsets
+
+
+def explosion_easing(max_life):
+    # 残り寿命 life (0..max_life) ごとの爆発半径の割合。前半は広がり、後半はしぼむ
+    table = _easing_tables.get(max_life)
+    if table is None:
+        table = []
+        for life in range(max_life + 1):
+            progress = life / max_life
+            if progress > 0.4:
+                t = (1 - progress) / 0.6
+                table.append(1 - (1 - t) * (1 - t) * (1 - t) * (1 - t))
+            else:
+                t = progress / 0.4
+                table.append(t * t * t * t)
+        table = _easing_tables[max_life] = tuple(table)
+    return table
+
+
+def rotated_quad(width, height):
+    # 幅 width, 高さ height の矩形を ANGLE_STEPS 段階で回したときの4隅（中心からの相対座標）
+    table = _quad_tables.get((width, height))
+    if table is None:
+        corners = (
+            (-width / 2, -height / 2),
+            (width / 2, -height / 2),
+            (width / 2, height / 2),
+            (-width / 2, height / 2),
+        )
+        table = []
+        for step in range(ANGLE_STEPS):
+            rad = step * (360 / ANGLE_STEPS) * DEG_TO_RAD
+            cos_a = math.cos(rad)
+            sin_a = math.sin(rad)
+            quad = []
+            for corner_x, corner_y in corners:
+                quad.append(corner_x * cos_a - corner_y * sin_a)
+                quad.append(corner_x * sin_a + corner_y * cos_a)
+            table.append(tuple(quad))
+        table = _quad_tables[(width, height)] = tuple(table)
+    return table
+
+
+def angle_step(angle, steps=ANGLE_STEPS):
+    # 角度（度）を rotated_quad の表の番号（steps 段階のときはその番号）に丸める
+    return int(round(angle * steps / 360)) % steps
+
+
+def sprite_steps(cell, image_size=256):
+    # image_size 四方の画像に cell 四方のスプライトを並べるとき、入りきる回転の段階数
+    # （ANGLE_STEPS を割り切れる数にして、どの段階も rotated_quad の表の角度と一致させる）
+    capacity = (image_size // cell) ** 2
+    for steps in range(min(capacity, ANGLE_STEPS), 0, -1):
+        if ANGLE_STEPS % steps == 0:
+            return steps
+    return 1
+
+
+# ゲームで使う組み合わせは最初に作っておく
+for _num_points in range(8, 33):
+    ring_offsets(_num_points)
@@ -0,0 +1,181 @@
+import mmap
+import os
+import random
+import struct
+import sys
+from array import array
+
+# レベルファイルの形式（リトルエンディアン）:
+#   ヘッダ  "BRKL" + version(u8) + block_width(u8) + block_height(u8)
+#           + origin_x(i16) + origin_y(i16) + pitch_x(u8) + pitch_y(u8) + count(u32)
+#   本体    (col u16, row u16, color u8) が count 個
+# ブロックの位置は origin + (col * pitch_x, row * pitch_y)。
+MAGIC = b"BRKL"
+VERSION = 1
+HEADER = struct.Struct("<4sBBBhhBBI")
+RECORD = struct.Struct("<HHB")
+
+
+class Level:
+    """読み込み済みの盤面。ブロックの座標と色を配列で持ち、Board にそのまま複製できる。"""
+
+    def __init__(self, block_width, block_height):
+        self.block_width = block_width
+        self.block_height = block_height
+        self.x = array('d')
+        self.y = array('d')
+        self.color = array('B')
+        self._zeros = {}
+        self._ones = None
+        self._grid_cells = {}
+
+    def __len__(self):
+        return len(self.color)
+
+    def add(self, x, y, color):
+        self.x.append(x)
+        self.y.append(y)
+        self.color.append(color)
+
+    def zeros(self, typecode):
+        # Board の動きの項目をリセットするための 0 埋め配列（作るのは最初の1回だけ）
+        zeros = self._zeros.get(typecode)
+        if zeros is None or len(zeros) != len(self):
+            zeros = self._zeros[typecode] = array(typecode, bytes(array(typecode).itemsize * len(self)))
+        return zeros
+
+    def ones(self):
+        # Board.active をリセットするための 1 埋めのバイト列（作るのは最初の1回だけ）
+        ones = self._ones
+        if ones is None or len(ones) != len(self):
+            ones = self._ones = b'\x01' * len(self)
+        return ones
+
+    def grid_cells(self, grid):
+        # BlockGrid に登録した状態の雛形。リスタートのたびに登録し直さずに複製で済ませる
+        key = (grid.cell_width, grid.cell_height)
+        cells = self._grid_cells.get(key)
+        if cells is None:
+            cells = {}
+            for i in range(len(self)):
+                for cell in grid.cell_range(self.x[i], self.y[i], self.block_width, self.block_height):
+                    cells.setdefault(cell, []).append(i)
+            self._grid_cells[key] = cells
+        return cells
+
+
+def read_header(level_bytes):
+    # ヘッダを取り出す。途中で切れたファイルは ValueError にする
+    if len(level_bytes) < HEADER.size:
+        raise ValueError("truncated level header")
+    header = HEADER.unpack_from(level_bytes)
+    if header[0] != MAGIC or header[1] != VERSION:
+        raise ValueError("not a level file")
+    return header
+
+
+def iter_cells(level_bytes):
+    # ヘッダと (col, row, color) をバッファから順に取り出す（中間リストを作らない）
+    magic, version, block_width, block_height, origin_x, origin_y, pitch_x, pitch_y, count = \
+        read_header(level_bytes)
+    body = memoryview(level_bytes)[HEADER.size:HEADER.size + count * RECORD.size]
+    if len(body) != count * RECORD.size:
+        body.release()
+        raise ValueError(f"truncated level body: {count} blocks in the header, "
+                         f"{(len(level_bytes) - HEADER.size) // RECORD.size} in the file")
+    try:
+        for col, row, color in RECORD.iter_unpack(body):
+            yield origin_x + col * pitch_x, origin_y + row * pitch_y, color
+    finally:
+        body.release()
+
+
+def read_level(level_bytes):
+    block_width, block_height = read_header(level_bytes)[2:4]
+    level = Level(block_width, block_height)
+    for x, y, color in iter_cells(level_bytes):
+        level.add(x, y, color)
+    return level
+
+
+_cache = {}
+
+
+def load_level(path):
+    # ファイルをメモリマップして読み込む。同じファイルなら2回目以降は解析済みの Level を返す
+    stat = os.stat(path)
+    key = os.path.abspath(path)
+    cached = _cache.get(key)
+    if cached is not None and cached[0] == (stat.st_mtime_ns, stat.st_size):
+        return cached[1]
+    try:
+        with open(path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                level = read_level(mapped)
+    except ValueError as e:  # 空のファイルは mmap が ValueError にする
+        raise ValueError(f"{path}: {e}") from None
+    _cache[key] = ((stat.st_mtime_ns, stat.st_size), level)
+    return level
+
+
+def write_level(path, cells, block_width=10, block_height=8, origin=(5, 10), pitch=(11, 10)):
+    # cells は (col, row, color) を返す反復子。生成しながら順に書き出すので全体をメモリに持たない
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, block_width, block_height,
+                            origin[0], origin[1], pitch[0], pitch[1], 0))
+        count = 0
+        for col, row, color in cells:
+            f.write(RECORD.pack(col, row, color))
+            count += 1
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, block_width, block_height,
+                            origin[0], origin[1], pitch[0], pitch[1], count))
+    return count
+
+
+def default_cells():
+    # 元々 init_game に書かれていた 5x14 の盤面
+    for row in range(5):
+        for col in range(14):
+            yield col, row, 8 + row % 7
+
+
+def random_cells(cols, rows, seed=None, density=0.7):
+    # 手続き生成の盤面。左右対称に穴を空け、行ごとに色を変える
+    rng = random.Random(seed)
+    for row in range(rows):
+        color = 8 + rng.randrange(7)
+        half = (cols + 1) // 2
+        filled = [rng.random() < density for _ in range(half)]
+        for col in range(cols):
+            if filled[min(col, cols - 1 - col)]:
+                yield col, row, color
+
+
+def build_level(cells, block_width=10, block_height=8, origin=(5, 10), pitch=(11, 10)):
+    # (col, row, color) の反復子から、ファイルを経由せずに Level を作る
+    level = Level(block_width, block_height)
+    for col, row, color in cells:
+        level.add(origin[0] + col * pitch[0], origin[1] + row * pitch[1], color)
+    return level
+
+
+_default_level = None
+
+
+def default_level():
+    global _default_level
+    if _default_level is None:
+        _default_level = build_level(default_cells())
+    return _default_level
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4:
+        print("usage: python levels.py OUT COLS ROWS [SEED]")
+        sys.exit(1)
+    cols = int(sys.argv[2])
+    rows = int(sys.argv[3])
+    seed = int(sys.argv[4]) if len(sys.argv) > 4 else None
+    count = write_level(sys.argv[1], random_cells(cols, rows, seed))
+    print(f"wrote {count} blocks to {sys.argv[1]}")
@@ -0,0 +1,27 @@
+import numpy as np
+
+# パーティクルの寿命・除去・移動を NumPy の配列演算でまとめて進める。ParticlePool の配列を
+# そのまま NumPy のビューとして書き換えるのでコピーはしない（ビューはこの関数の中だけで使う）。
+
+
+def _view(field, count):
+    return np.frombuffer(field, dtype=field.typecode)[:count]
+
+
+def update_particles(pool):
+    # ParticlePool.update のループと同じ結果になる（生きている粒を順番を変えずに前に詰めてから動かす）
+    count = pool.count
+    life = _view(pool.life, count)
+    life -= 1
+    alive = np.flatnonzero(life > 0)
+    live = len(alive)
+    x = _view(pool.x, count)
+    y = _view(pool.y, count)
+    dx = _view(pool.dx, count)
+    dy = _view(pool.dy, count)
+    if live < count:
+        for field in (x, y, dx, dy, life, _view(pool.color, count)):
+            field[:live] = field[alive]
+    x[:live] += dx[:live]
+    y[:live] += dy[:live]
+    pool.count = live
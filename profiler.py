@@ -0,0 +1,250 @@
+import gc
+import sys
+import time
+from collections import deque
+
+perf_counter = time.perf_counter
+
+
+class NullProfiler:
+    """計測しないときに使う何もしないプロファイラ。呼び出しのコストだけで済む。"""
+
+    enabled = False
+
+    def start(self):
+        pass
+
+    def skip(self):
+        pass
+
+    def mark(self, name):
+        pass
+
+    def end_frame(self):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+class FrameProfiler:
+    """1フレームの処理を区間ごとに計測し、直近 window フレーム分の分布を保持する。
+
+    start() でフレームを始め、区間の終わりごとに mark(name) を呼ぶと、直前の mark から
+    の時間がその区間に加算される。skip() は計測対象外の時間（pyxel 本体の処理など）を
+    読み飛ばす。trace=True にすると各区間を Chrome の trace 形式で書き出せる。
+    """
+
+    enabled = True
+
+    def __init__(self, window=300, trace=False):
+        self.window = window
+        self.history = {}
+        self.current = {}
+        self.frame = 0
+        self.last = perf_counter()
+        self.origin = self.last
+        self.trace_events = [] if trace else None
+
+    def start(self):
+        self.last = perf_counter()
+
+    def skip(self):
+        self.last = perf_counter()
+
+    def mark(self, name):
+        now = perf_counter()
+        elapsed = now - self.last
+        self.current[name] = self.current.get(name, 0) + elapsed
+        if self.trace_events is not None:
+            self.trace_events.append((name, self.last, elapsed, self.frame))
+        self.last = now
+
+    def end_frame(self):
+        total = 0
+        for name, elapsed in self.current.items():
+            self.record(name, elapsed)
+            total += elapsed
+        self.record('frame', total)
+        self.current.clear()
+        self.frame += 1
+
+    def record(self, name, elapsed):
+        samples = self.history.get(name)
+        if samples is None:
+            samples = self.history[name] = deque(maxlen=self.window)
+        samples.append(elapsed * 1000)
+
+    def percentile(self, name, p):
+        samples = self.history.get(name)
+        if not samples:
+            return 0.0
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(len(ordered) * p / 100))
+        return ordered[index]
+
+    def summary(self):
+        # (区間名, p50, p95, p99) をミリ秒で、p99 の大きい順に返す
+        rows = []
+        for name in self.history:
+            rows.append((name, self.percentile(name, 50), self.percentile(name, 95), self.percentile(name, 99)))
+        rows.sort(key=lambda row: row[3], reverse=True)
+        return rows
+
+    def chrome_trace(self):
+        events = []
+        for name, start, elapsed, frame in self.trace_events or ():
+            events.append({
+                'name': name,
+                'ph': 'X',
+                'ts': (start - self.origin) * 1e6,
+                'dur': elapsed * 1e6,
+                'pid': 1,
+                'tid': 1,
+                'args': {'frame': frame},
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export_chrome_trace(self, path):
+        import json  # 書き出すときだけ使うので起動時には読み込まない
+        with open(path, 'w') as f:
+            json.dump(self.chrome_trace(), f)
+
+
+class AllocationProfiler:
+    """1フレームの処理を区間ごとに、Python がどれだけメモリを確保したかで計測する。
+
+    FrameProfiler と同じく start/skip/mark/end_frame で使う（Game.profiler に入れられる）。
+    区間の値は3つ:
+      bytes    区間中のメモリ使用量が区間の開始時より最大でどれだけ増えたか（tracemalloc）。
+               すぐ解放される一時オブジェクトも数えるので、0 ならその区間は何も確保していない
+      kept     区間の前後で増えたメモリ使用量（区間の後まで残ったもの）
+      objects  区間の前後で増えた GC 対象のオブジェクト数。これが積もると GC が走る
+    計測中は区間の途中で GC が走らないよう止め、end_frame で元に戻す。
+    """
+
+    enabled = True
+
+    def __init__(self, window=300):
+        self.window = window
+        self.history = {}
+        self.kept = {}
+        self.objects = {}
+        self.current = {}
+        self.current_kept = {}
+        self.current_objects = {}
+        self.last_frame = {}  # 直前のフレームの {区間名: (bytes, kept, objects)}
+        self.frame = 0
+        # tracemalloc は読み込みが重い（pickle なども読む）ので使うときだけ読み込む
+        import tracemalloc
+        self.tracemalloc = tracemalloc
+        self.get_traced_memory = tracemalloc.get_traced_memory
+        self.reset_peak = tracemalloc.reset_peak
+        # 自分で始めたときだけ close() で止める
+        self.owns_tracing = not tracemalloc.is_tracing()
+        if self.owns_tracing:
+            tracemalloc.start()
+        self.gc_was_enabled = gc.isenabled()
+        self.base = 0
+        self.gc_base = 0
+        self.reset()
+
+    def close(self):
+        if self.gc_was_enabled:
+            gc.enable()
+        if self.owns_tracing:
+            self.tracemalloc.stop()
+
+    def reset(self):
+        # ここから次の mark までを1区間にする。読んだ値を入れる int は古い値の int と入れ替わる
+        # だけなので、使用量は変わらない。その後で peak を今の使用量に戻す
+        self.base = self.get_traced_memory()[0]
+        self.gc_base = gc.get_count()[0]
+        self.reset_peak()
+
+    def start(self):
+        gc.disable()
+        self.reset()
+
+    def skip(self):
+        self.reset()
+
+    def mark(self, name):
+        size, peak = self.get_traced_memory()
+        objects = gc.get_count()[0] - self.gc_base
+        self.current[name] = self.current.get(name, 0) + peak - self.base
+        self.current_kept[name] = self.current_kept.get(name, 0) + size - self.base
+        self.current_objects[name] = self.current_objects.get(name, 0) + objects
+        # 読んだ値の int を持ったまま reset すると、return で解放された分だけ使用量が基準より減り、
+        # 次の区間の最初の確保がその分見えなくなる。先に手放しておく
+        size = peak = objects = None
+        self.reset()
+
+    def end_frame(self):
+        total = 0
+        total_kept = 0
+        total_objects = 0
+        self.last_frame.clear()
+        for name, size in self.current.items():
+            kept = self.current_kept[name]
+            objects = self.current_objects[name]
+            self.record(name, size, kept, objects)
+            self.last_frame[name] = (size, kept, objects)
+            total += size
+            total_kept += kept
+            total_objects += objects
+        self.record('frame', total, total_kept, total_objects)
+        self.current.clear()
+        self.current_kept.clear()
+        self.current_objects.clear()
+        self.frame += 1
+        if self.gc_was_enabled:
+            gc.enable()
+
+    def record(self, name, size, kept, objects):
+        samples = self.history.get(name)
+        if samples is None:
+            samples = self.history[name] = deque(maxlen=self.window)
+            self.kept[name] = deque(maxlen=self.window)
+            self.objects[name] = deque(maxlen=self.window)
+        samples.append(size)
+        self.kept[name].append(kept)
+        self.objects[name].append(objects)
+
+    def summary(self):
+        # (区間名, 平均 bytes, 最大 bytes, bytes が 0 でなかったフレームの割合, 平均 kept, 平均 objects) を
+        # 平均 bytes の大きい順に返す。平均はその区間を通ったフレームあたり
+        rows = []
+        for name, samples in self.history.items():
+            kept = self.kept[name]
+            objects = self.objects[name]
+            rows.append((name, sum(samples) / len(samples), max(samples),
+                         sum(1 for size in samples if size > 0) / len(samples),
+                         sum(kept) / len(kept), sum(objects) / len(objects)))
+        rows.sort(key=lambda row: row[1], reverse=True)
+        return rows
+
+
+def format_summary(profiler):
+    lines = [f"{'phase':<12}{'p50':>8}{'p95':>8}{'p99':>8}  (ms)"]
+    for name, p50, p95, p99 in profiler.summary():
+        lines.append(f"{name:<12}{p50:8.3f}{p95:8.3f}{p99:8.3f}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    from game_core import Game, follow_ball_input
+
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    trace_path = sys.argv[2] if len(sys.argv) > 2 else None
+    profiler = FrameProfiler(window=frames, trace=trace_path is not None)
+    game = Game(seed=0)
+    game.profiler = profiler
+    for _ in range(frames):
+        profiler.start()
+        game.update(follow_ball_input(game))
+        profiler.end_frame()
+    print(format_summary(profiler))
+    if trace_path:
+        profiler.export_chrome_trace(trace_path)
+        print(f"trace written to {trace_path}")
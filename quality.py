@@ -0,0 +1,65 @@
+import time
+
+from game_core import FPS
+
+perf_counter = time.perf_counter
+
+# 演出の量の段階（1.0 が通常）。パーティクルの数と寿命、爆発の輪の点の数、残像の長さに掛ける
+QUALITY_LEVELS = (1.0, 0.75, 0.5, 0.3, 0.15)
+
+
+class QualityGovernor:
+    """update と draw にかかった時間を毎フレーム測り、演出の量を予算に収まるよう上げ下げする。
+
+    直近 window フレームの平均が予算の high 倍を超えるか、1フレームでも予算を超えたら1段
+    下げ、平均が low 倍を下回る状態が recover フレーム続いたら1段戻す。結果は
+    game.effect_scale に入れるだけなので、ゲームの進行には影響しない。
+    """
+
+    def __init__(self, budget=1 / FPS, window=15, high=0.75, low=0.4, recover=90):
+        self.budget = budget
+        self.window = window
+        self.high = high
+        self.low = low
+        self.recover = recover
+        self.level = 0
+        self.samples = [0.0] * window
+        self.next_sample = 0
+        self.total = 0.0
+        self.calm_frames = 0
+        self.cooldown = 0
+        self.frame_start = perf_counter()
+
+    @property
+    def scale(self):
+        return QUALITY_LEVELS[self.level]
+
+    def start(self):
+        self.frame_start = perf_counter()
+
+    def end_frame(self, game):
+        # start() からの時間を記録し、段階を決め直して game に反映する
+        elapsed = perf_counter() - self.frame_start
+        i = self.next_sample
+        self.total += elapsed - self.samples[i]
+        self.samples[i] = elapsed
+        self.next_sample = (i + 1) % self.window
+
+        average = self.total / self.window
+        if self.cooldown > 0:
+            # 段階を変えた直後は、変えた効果が平均に出るまで待つ
+            self.cooldown -= 1
+        elif elapsed > self.budget or average > self.budget * self.high:
+            if self.level < len(QUALITY_LEVELS) - 1:
+                self.level += 1
+                self.cooldown = self.window
+            self.calm_frames = 0
+        elif average < self.budget * self.low:
+            self.calm_frames += 1
+            if self.calm_frames >= self.recover and self.level > 0:
+                self.level -= 1
+                self.cooldown = self.window
+                self.calm_frames = 0
+        else:
+            self.calm_frames = 0
+        game.effect_scale = QUALITY_LEVELS[self.level]
@@ -0,0 +1,144 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from benchmarks import start_scenario
+from framebuffer import Framebuffer
+from quality import QualityGovernor
+from simple_game import App
+
+# ウィンドウなしで App.draw を framebuffer.Framebuffer に描かせ、描画の速さを測ったり、
+# 決まったフレームの絵を保存しておいた絵（ゴールデン）と1画素ずつ比べたりする。
+# ゴールデンは --update-golden で作り直す（描画を意図して変えたときだけ）。
+GOLDEN_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden_frames.npz")
+ACTUAL_FILE = "render_actual.npz"  # ゴールデンと違ったときに今回の絵を書き出す先
+WIDTH = 160
+HEIGHT = 120
+
+
+# (名前, フレーム数, 絵を比べるフレーム)。シナリオは benchmarks.py のもので、ゲームは seed 0 から
+# 始めるので毎回同じ絵になる
+SCENARIOS = [
+    ('play', 900, (1, 150, 300, 450, 600, 899)),
+    ('combo', 120, (8, 9, 20, 60)),
+    ('collapse', 90, (5, 20, 40, 60, 89)),
+    ('storm', 60, (1, 30, 59)),
+    ('clear', 20, (1, 19)),
+]
+
+
+def make_app(gfx, name, seed=0):
+    # gfx に描く App をシナリオ name のゲームで作り、(app, step) を返す。演出の量は処理時間で
+    # 変わると絵が揺れるので通常のまま固定する
+    app = App(gfx)
+    app.game, step = start_scenario(name, seed, width=gfx.width, height=gfx.height)
+    app.governor = QualityGovernor(budget=float('inf'))
+    return app, step
+
+
+def render(gfx, grab, name, frames, capture, seed=0):
+    # シナリオを frames フレーム回して毎フレーム描き、(capture の絵の dict, 描画時間の list) を返す。
+    # 点滅は gfx.frame_count で決まるので、ウィンドウなしの pyxel と同じく 0 のままにする
+    app, step = make_app(gfx, name, seed)
+    game = app.game
+    perf_counter = time.perf_counter
+    images = {}
+    draw_times = []
+    for frame in range(frames):
+        game.update(step(game))
+        start = perf_counter()
+        app.draw()
+        draw_times.append(perf_counter() - start)
+        if frame in capture:
+            images[frame] = grab()
+    return images, draw_times
+
+
+def framebuffer_target():
+    fb = Framebuffer(WIDTH, HEIGHT)
+    return fb, lambda: fb.pixels.copy()
+
+
+def pyxel_target():
+    # 比べる相手として本物の pyxel の画面に描く（SDL_VIDEODRIVER=offscreen ならウィンドウは出ない）
+    import pyxel
+    if pyxel.width != WIDTH or pyxel.height != HEIGHT:
+        pyxel.init(WIDTH, HEIGHT)
+    screen = np.frombuffer(pyxel.screen.data_ptr(), dtype=np.uint8).reshape(HEIGHT, WIDTH)
+    return pyxel, lambda: screen.copy()
+
+
+def describe_diff(expected, actual):
+    if expected.shape != actual.shape:
+        return f"size {actual.shape} != {expected.shape}"
+    rows, cols = np.nonzero(expected != actual)
+    return (f"{len(rows)} pixels differ in x {cols.min()}..{cols.max()}, "
+            f"y {rows.min()}..{rows.max()}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless render benchmark and golden-image check")
+    parser.add_argument('scenarios', nargs='*', help="scenarios to run (default: all)")
+    parser.add_argument('--golden', default=GOLDEN_FILE)
+    parser.add_argument('--update-golden', action='store_true',
+                        help="store the rendered frames as the new golden frames")
+    parser.add_argument('--pyxel', action='store_true',
+                        help="also draw every scenario with pyxel and check the framebuffer matches it")
+    args = parser.parse_args(argv)
+
+    selected = [s for s in SCENARIOS if not args.scenarios or s[0] in args.scenarios]
+    golden = {}
+    if os.path.exists(args.golden):
+        with np.load(args.golden) as data:
+            golden = {key: data[key] for key in data.files}
+
+    rendered = {}
+    failures = []
+    print(f"{'scenario':<12}{'frames':>8}{'draw fps':>10}{'p50 ms':>9}{'p99 ms':>9}")
+    for name, frames, capture in selected:
+        gfx, grab = framebuffer_target()
+        images, draw_times = render(gfx, grab, name, frames, capture)
+        ordered = sorted(draw_times)
+        p50 = ordered[len(ordered) // 2]
+        p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+        print(f"{name:<12}{frames:8d}{frames / sum(draw_times):10.0f}{p50 * 1000:9.3f}{p99 * 1000:9.3f}")
+
+        for frame, image in images.items():
+            key = f"{name}_{frame}"
+            rendered[key] = image
+            if key not in golden:
+                if not args.update_golden:
+                    failures.append(f"{key}: no golden frame (run with --update-golden)")
+            elif not args.update_golden and not np.array_equal(golden[key], image):
+                failures.append(f"{key}: {describe_diff(golden[key], image)}")
+
+        if args.pyxel:
+            gfx, grab = pyxel_target()
+            expected, _ = render(gfx, grab, name, frames, capture)
+            for frame, image in expected.items():
+                if not np.array_equal(image, images[frame]):
+                    failures.append(f"{name}_{frame}: framebuffer differs from pyxel: "
+                                    f"{describe_diff(image, images[frame])}")
+
+    if args.update_golden:
+        golden.update(rendered)
+        np.savez_compressed(args.golden, **golden)
+        print(f"golden frames written to {args.golden}")
+        return 0
+
+    if failures:
+        np.savez_compressed(ACTUAL_FILE, **rendered)
+        print("\nRENDER MISMATCH:")
+        for failure in failures:
+            print("  " + failure)
+        print(f"rendered frames written to {ACTUAL_FILE}")
+        return 1
+    print(f"{len(rendered)} frames match")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+import struct
+import sys
+
+from game_core import WIDTH, HEIGHT, Game, follow_ball_input
+
+# ファイル形式:
+#   ヘッダ  "BRKR" + version(u8) + width(u16) + height(u16) + seed(u64)
+#   本体    (flags u8, [touch_x i16], frames u16) の繰り返し
+# 同じ入力が続くフレームは1レコードにまとめる（ランレングス）。
+MAGIC = b"BRKR"
+VERSION = 2  # 2: パーティクルと画面揺れの乱数をゲームの乱数から分けた
+HEADER = struct.Struct("<4sBHHQ")
+TOUCH_FLAG = 0x80
+MAX_RUN = 0xFFFF
+
+
+class InputLog:
+    """フレームごとのパドル入力を記録し、同じ seed のゲームでそのまま再生するためのログ。"""
+
+    def __init__(self, seed, width=WIDTH, height=HEIGHT):
+        self.seed = seed
+        self.width = width
+        self.height = height
+        self.runs = []  # [buttons, touch_x, frames]
+
+    def __len__(self):
+        return sum(run[2] for run in self.runs)
+
+    def record(self, buttons, touch_x=None):
+        if touch_x is not None:
+            touch_x = int(touch_x)
+        if self.runs:
+            last = self.runs[-1]
+            if last[0] == buttons and last[1] == touch_x and last[2] < MAX_RUN:
+                last[2] += 1
+                return
+        self.runs.append([buttons, touch_x, 1])
+
+    def __iter__(self):
+        for buttons, touch_x, frames in self.runs:
+            for _ in range(frames):
+                yield buttons, touch_x
+
+    def to_bytes(self):
+        out = bytearray(HEADER.pack(MAGIC, VERSION, self.width, self.height, self.seed))
+        for buttons, touch_x, frames in self.runs:
+            if touch_x is None:
+                out += struct.pack("<BH", buttons, frames)
+            else:
+                out += struct.pack("<BhH", buttons | TOUCH_FLAG, touch_x, frames)
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, version, width, height, seed = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not an input log")
+        log = cls(seed, width, height)
+        offset = HEADER.size
+        while offset < len(data):
+            flags = data[offset]
+            if flags & TOUCH_FLAG:
+                _, touch_x, frames = struct.unpack_from("<BhH", data, offset)
+                offset += 5
+            else:
+                touch_x = None
+                _, frames = struct.unpack_from("<BH", data, offset)
+                offset += 3
+            log.runs.append([flags & ~TOUCH_FLAG, touch_x, frames])
+        return log
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+
+def record(frames, policy=follow_ball_input, seed=None):
+    # policy でゲームを進めながら入力を記録する
+    game = Game(seed=seed)
+    log = InputLog(game.seed, game.width, game.height)
+    for _ in range(frames):
+        buttons = policy(game)
+        log.record(buttons)
+        game.update(buttons)
+    return game, log
+
+
+def replay(log, effects=False):
+    # 記録と同じ seed のゲームを作り、入力を1フレームずつ流し込む。演出は展開に影響しないので
+    # 結果だけが欲しいときは作らない
+    game = Game(log.width, log.height, seed=log.seed, effects=effects)
+    for buttons, touch_x in log:
+        game.update(buttons, touch_x)
+    return game
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("usage: python replay.py LOG [--record FRAMES [SEED]]")
+        sys.exit(1)
+    if len(sys.argv) > 3 and sys.argv[2] == "--record":
+        seed = int(sys.argv[4]) if len(sys.argv) > 4 else None
+        _, log = record(int(sys.argv[3]), seed=seed)
+        log.save(sys.argv[1])
+        print(f"recorded {len(log)} frames (seed {log.seed}) to {sys.argv[1]}")
+    else:
+        game = replay(InputLog.load(sys.argv[1]))
+        print(f"replayed {game.frame_count} frames: "
+              f"blocks left {game.blocks.live}, max combo {game.max_combo}, "
+              f"cleared {game.game_cleared}, game over {game.game_over}")
@@ -1,635 +1,416 @@
-import pyxel
 import math
-import random
-import time
-
-TOUCH_CONTROL = False  # タッチ操作の有効化フラグ
-
-class Particle:
-    def __init__(self, x, y, color):
-        self.x = x
-        self.y = y
-        self.color = color
-        angle = random.uniform(0, math.pi * 2)
-        speed = random.uniform(1.5, 4.0)
-        self.dx = math.cos(angle) * speed
-        self.dy = math.sin(angle) * speed
-        self.life = 30
-        self.size = 1
 
-    def update(self):
-        self.x += self.dx
-        self.y += self.dy
-        self.life -= 1
-        return self.life > 0
+import pyxel
 
-    def draw(self):
-        pyxel.pset(self.x, self.y, self.color)
+from game_core import Game, BTN_LEFT, BTN_RIGHT, BTN_RESTART
+from geometry import ANGLE_STEPS, angle_step, ring_offsets, rotated_quad, sprite_steps
+from levels import load_level
+from display_list import DisplayList
+from profiler import NULL_PROFILER, FrameProfiler
+from quality import QualityGovernor
 
-class Ball:
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-        self.size = 2
-        angle = random.uniform(-60, 60)
-        speed = 2
-        self.dx = speed * math.sin(math.radians(angle))
-        self.dy = -speed * math.cos(math.radians(angle))
-        self.trail_positions = []
-        self.max_trail = 8
+TOUCH_CONTROL = False  # タッチ操作の有効化フラグ
+TRACE_FILE = "frame_trace.json"  # F2 で記録したフレームトレースの書き出し先
+BLOCK_LAYER_IMAGE = 0  # ブロック面を描いておくイメージバンク
+BALL_STORM = False  # ボールストームモード（何千個ものボールをまとめて処理する。numpy が必要）
+STORM_IMAGE = 1  # ボールストームモードでボールを描き込むイメージバンク
+COLLAPSE_IMAGE = 2  # 崩落中の回転ブロックの絵（角度ごと）を描いておくイメージバンク
+SPRITE_COLOR = 1  # 回転ブロックの絵の色。描くときに pal でブロックの色に置き換える
+LEVEL_FILE = None  # 盤面を読み込むレベルファイル（None なら標準の 5x14 の盤面。levels.py で作れる）
 
-    def update(self, app):
-        self.trail_positions.insert(0, (self.x, self.y))
-        if len(self.trail_positions) > self.max_trail:
-            self.trail_positions.pop()
+class App:
+    def __init__(self, gfx=None):
+        # gfx は描画先。None ならウィンドウを開いて pyxel で動かす。framebuffer.Framebuffer
+        # （か初期化済みの pyxel）を渡すと作るだけで、draw() を呼ぶとそこに描く（render_check.py）
+        window = gfx is None
+        if window:
+            pyxel.init(160, 120, title="Break the blocks")
+            gfx = pyxel
+        self.gfx = gfx
+        self.is_touching = False
+        level = load_level(LEVEL_FILE) if LEVEL_FILE else None
+        # NumPy を読み込むと起動が遅くなるので、パーティクルをまとめて進めるのはボールストームのときだけ
+        self.game = Game(gfx.width, gfx.height, ball_storm=BALL_STORM, level=level, vector_particles=BALL_STORM)
+        self.profiler = None  # F1 か F2 を初めて押したときに作る
+        self.show_profiler = False
+        self.profiler_rows = []
+        # 処理が重くなったら演出を減らす（現在の段階は画面右上に出す）
+        self.governor = QualityGovernor()
+        self.fx_level = 0
+        self.fx_text = ""  # 画面右上に出す演出の段階（fx_level の段階のもの）
+        # 描画命令はいったん表示リストにため、画面外を捨て同じ色の rect をまとめてから描く
+        self.screen = DisplayList(gfx.width, gfx.height)
+        # ブロック面は変化したときだけイメージバンクに描き直し、毎フレームは blt 1回で描く
+        self.block_layer = None
+        self.layer_version = None
+        self.layer_active = bytearray()
+        self.storm_pixels = None
+        # 回転ブロックの絵は最初の崩落のときに角度ごとに描いておく
+        self.block_sprites = None
+        self.sprite_color = None
+        self.clear_texts = None  # クリア画面の文字列（クリアしている間は作り直さない）
+        if window:
+            pyxel.run(self.update, self.draw)
 
-        next_x = self.x + self.dx
-        next_y = self.y + self.dy
-        
-        if next_x < 0:
-            self.x = 0
-            self.dx = abs(self.dx)
-        elif next_x > pyxel.width - self.size:
-            self.x = pyxel.width - self.size
-            self.dx = -abs(self.dx)
-        else:
-            self.x = next_x
-            
-        if next_y < 0:
-            self.y = 0
-            self.dy = abs(self.dy)
+    def read_input(self):
+        buttons = 0
+        touch_x = None
+        if TOUCH_CONTROL:
+            if pyxel.btnp(pyxel.MOUSE_BUTTON_LEFT):
+                self.is_touching = True
+            if pyxel.btnr(pyxel.MOUSE_BUTTON_LEFT):
+                self.is_touching = False
+            if self.is_touching:
+                touch_x = pyxel.mouse_x
         else:
-            self.y = next_y
-
-        if (self.y + self.size > app.paddle_y and 
-            self.x + self.size > app.paddle_x and 
-            self.x < app.paddle_x + app.paddle_width):
-            
-            relative_intersect_x = (app.paddle_x + (app.paddle_width / 2)) - self.x
-            normalized_intersect = relative_intersect_x / (app.paddle_width / 2)
-            bounce_angle = normalized_intersect * 60
-            
-            speed = math.sqrt(self.dx ** 2 + self.dy ** 2)
-            self.dx = -speed * math.sin(math.radians(bounce_angle))
-            self.dy = -speed * math.cos(math.radians(bounce_angle))
-            
-            self.y = app.paddle_y - self.size
-
-    def draw(self):
-        for i, (trail_x, trail_y) in enumerate(self.trail_positions[1:], 1):
-            alpha = (self.max_trail - i) / self.max_trail
-            color = 1 if i > self.max_trail // 2 else 5
-            pyxel.rect(trail_x, trail_y, self.size, self.size, color)
-        
-        pyxel.rect(self.x, self.y, self.size, self.size, 7)
-
-class Item:
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-        self.size = 4
-        self.speed = 1
-        self.active = True
+            if pyxel.btn(pyxel.KEY_LEFT):
+                buttons |= BTN_LEFT
+            if pyxel.btn(pyxel.KEY_RIGHT):
+                buttons |= BTN_RIGHT
+        if pyxel.btnp(pyxel.KEY_SPACE):
+            buttons |= BTN_RESTART
+        return buttons, touch_x
 
     def update(self):
-        self.y += self.speed
-        return self.y < pyxel.height
+        self.governor.start()
+        self.update_profiler_keys()
+        self.game.profiler.start()
+        buttons, touch_x = self.read_input()
+        self.game.update(buttons, touch_x)
 
-    def draw(self):
-        if pyxel.frame_count % 30 < 15:
-            color = 11
-        else:
-            color = 10
-        pyxel.rect(self.x, self.y, self.size, self.size, color)
+    def update_profiler_keys(self):
+        # F1: 計測と画面表示の切り替え、F2: トレース記録の開始/終了（終了時にファイルへ書き出す）
+        if pyxel.btnp(pyxel.KEY_F1):
+            self.show_profiler = not self.show_profiler
+        if pyxel.btnp(pyxel.KEY_F2):
+            if self.profiler is None:
+                self.profiler = FrameProfiler()
+            if self.profiler.trace_events is None:
+                self.profiler.trace_events = []
+            else:
+                self.profiler.export_chrome_trace(TRACE_FILE)
+                self.profiler.trace_events = None
+        if self.show_profiler and self.profiler is None:
+            self.profiler = FrameProfiler()
+        tracing = self.profiler is not None and self.profiler.trace_events is not None
+        self.game.profiler = self.profiler if self.show_profiler or tracing else NULL_PROFILER
 
-class ExplosionEffect:
-    def __init__(self, x, y, combo):
-        self.x = x
-        self.y = y
-        self.combo = combo
-        self.life = 8
-        self.max_life = 8
-        base_radius = 12
-        combo_bonus = combo * 6
-        self.max_radius = min(base_radius + combo_bonus, 60)
-        
-    def update(self):
-        self.life -= 1
-        return self.life > 0
-    
-    def get_current_radius(self):
-        progress = self.life / self.max_life
-        if progress > 0.4:
-            t = (1 - progress) / 0.6
-            return self.max_radius * (1 - (1 - t) * (1 - t) * (1 - t) * (1 - t))
-        else:
-            t = progress / 0.4
-            return self.max_radius * (t * t * t * t)
-    
     def draw(self):
-        radius = self.get_current_radius()
-        num_trails = min(self.combo * 4 + 8, 32)
-        
-        for i in range(num_trails):
-            angle = (i / num_trails) * math.pi * 2
-            trail_x = self.x + math.cos(angle) * radius
-            trail_y = self.y + math.sin(angle) * radius
-            color = 10 if self.combo >= 3 else 6
-            pyxel.pset(trail_x, trail_y, color)
-
-        center_color = 7 if self.combo < 3 else 10
-        center_size = min(1 + self.combo // 2, 4)
-        pyxel.circ(self.x, self.y, center_size, center_color)
-
-class App:
-    def __init__(self):
-        pyxel.init(160, 120, title="Break the blocks")
-        self.touch_x = 0
-        self.is_touching = False
-        self.init_game()
-        pyxel.run(self.update, self.draw)
-    
-    def init_game(self):
-        self.paddle_x = 80
-        self.paddle_width = 24
-        self.paddle_height = 2
-        self.paddle_y = 110
-        self.paddle_trail = []
-        self.max_paddle_trail = 4
-        self.paddle_opacity = 1.0
-        self.paddle_exit_started = False
-        self.paddle_exit_speed = 0
-        
-        self.balls = [Ball(80, 90)]
-        
-        self.blocks = []
-        self.block_width = 10
-        self.block_height = 8
-        for row in range(5):
-            for col in range(14):
-                self.blocks.append({
-                    'x': col * (self.block_width + 1) + 5,
-                    'y': row * (self.block_height + 2) + 10,
-                    'active': True,
-                    'fall_speed': 0,
-                    'color': 8 + row % 7,
-                    'rotation': 0,
-                    'rotate_speed': 0,
-                    'fall_delay': 0,
-                    'horizontal_speed': 0
-                })
-        
-        self.particles = []
-        self.items = []
-        self.game_cleared = False
-        self.game_over = False
-        self.game_over_timer = 0
-        self.clear_message_y = 60
-        self.start_time = time.time()
-        self.clear_time = 0
-        self.bonus_time = 0
-        self.ball_bonus = 0
-        self.combo_bonus = 0
-        self.total_combo_bonus = 0  # 累積コンボボーナスを追加
-        
-        self.current_combo = 0
-        self.max_combo = 0  # 最大コンボ数を記録
-        self.combo_timer = 0
-        self.max_combo_timer = 30
-        self.screen_shake = {'x': 0, 'y': 0, 'duration': 0, 'magnitude': 0}
-        self.combo_text = {'text': '', 'x': 0, 'y': 0, 'timer': 0}
-        self.explosion_effects = []
+        profiler = self.game.profiler
+        profiler.skip()
+        self.screen.clear()
+        self.draw_game(profiler)
+        self.screen.submit(self.gfx)
+        profiler.mark('draw_submit')
+        profiler.end_frame()
+        if self.show_profiler:
+            self.draw_profiler()
+        self.governor.end_frame(self.game)
+        if self.governor.level > 0:
+            if self.fx_level != self.governor.level:
+                # 表示は段階が変わったときだけ作り直す
+                self.fx_level = self.governor.level
+                self.fx_text = f"FX{int(self.governor.scale * 100):3d}%"
+            self.gfx.text(self.gfx.width - 28, 1, self.fx_text, 5)
 
-    def update(self):
-        if self.game_cleared:
-            if pyxel.btnp(pyxel.KEY_SPACE):
-                self.init_game()
-            return
-
-        if self.game_over:
-            self.update_game_over()
-            if pyxel.btnp(pyxel.KEY_SPACE):
-                self.init_game()
-            return
-
-        self.update_paddle()
-        
-        if self.combo_timer > 0:
-            self.combo_timer -= 1
-        elif self.current_combo > 0:
-            self.current_combo = 0
-        
-        self.update_screen_shake()
-        
-        self.explosion_effects = [effect for effect in self.explosion_effects if effect.update()]
-        
-        active_balls = []
-        for ball in self.balls:
-            ball.update(self)
-            if ball.y < pyxel.height:
-                active_balls.append(ball)
-        self.balls = active_balls
-        
-        if not self.balls:
-            self.start_game_over()
-            return
-        
-        self.check_collisions()
-        self.particles = [p for p in self.particles if p.update()]
-        
-        active_items = []
-        for item in self.items:
-            if item.active and item.update():
-                if (item.y + item.size > self.paddle_y and
-                    item.x + item.size > self.paddle_x and
-                    item.x < self.paddle_x + self.paddle_width):
-                    item.active = False
-                    self.add_new_ball()
-                if item.active:
-                    active_items.append(item)
-        self.items = active_items
-        
-        if not any(block['active'] for block in self.blocks):
-            if not self.game_cleared:
-                self.clear_time = time.time() - self.start_time
-                # 複数ボールのボーナス
-                remaining_balls = len(self.balls)
-                if remaining_balls > 1:
-                    self.ball_bonus = remaining_balls - 1
-                else:
-                    self.ball_bonus = 0
-                # 合計ボーナスを計算して適用
-                self.combo_bonus = self.total_combo_bonus
-                self.bonus_time = self.ball_bonus + self.combo_bonus
-                self.clear_time = max(0, self.clear_time - self.bonus_time)
-            self.game_cleared = True
+    def draw_profiler(self):
+        # 集計は1秒に1回だけやり直す
+        gfx = self.gfx
+        if gfx.frame_count % 30 == 0 or not self.profiler_rows:
+            self.profiler_rows = self.profiler.summary()[:12]
+        gfx.rect(0, 0, 92, 8 + len(self.profiler_rows) * 7, 0)
+        gfx.text(1, 1, "PHASE       P50   P99", 7)
+        for i, (name, p50, p95, p99) in enumerate(self.profiler_rows):
+            color = 8 if name == 'frame' and p99 > 33 else 6
+            gfx.text(1, 8 + i * 7, f"{name[:10]:<10}{p50:6.2f}{p99:6.2f}", color)
+        # 表示リストの集計: 描いた命令数 / 画面外で捨てた数 / まとめた数
+        screen = self.screen
+        bottom = 8 + len(self.profiler_rows) * 7
+        gfx.rect(0, bottom, 92, 7, 0)
+        gfx.text(1, bottom, f"CALLS{screen.calls:5d} C{screen.culled:4d} M{screen.merged:4d}", 6)
+        if self.profiler.trace_events is not None:
+            gfx.text(1, bottom + 7, "TRACING", 8)
 
-    def draw(self):
-        pyxel.cls(0)
+    def draw_game(self, profiler):
+        screen = self.screen
+        g = self.game
+        screen.cls(0)
         
-        shake_x = self.screen_shake['x']
-        shake_y = self.screen_shake['y']
+        shake_x = g.screen_shake['x']
+        shake_y = g.screen_shake['y']
         
-        if self.game_cleared:
-            if pyxel.frame_count % 30 < 20:
-                pyxel.text(65 + shake_x, self.clear_message_y - 20 + shake_y, "FINISH!!!", 7)
+        if g.game_cleared:
+            if self.gfx.frame_count % 30 < 20:
+                screen.text(65 + shake_x, g.clear_message_y - 20 + shake_y, "FINISH!!!", 7)
             
-            # オリジナルの時間を表示
-            original_time = self.clear_time + self.bonus_time
-            o_minutes = int(original_time // 60)
-            o_seconds = int(original_time % 60)
-            o_milliseconds = int((original_time * 100) % 100)
-            original_text = f"ORIGINAL TIME: {o_minutes:02d}:{o_seconds:02d}.{o_milliseconds:02d}"
-            pyxel.text(35 + shake_x, self.clear_message_y + shake_y, original_text, 13)
+            # オリジナルの時間を表示（文字列はクリアしたときに1回だけ作る）
+            if self.clear_texts is None:
+                self.clear_texts = self.format_clear_texts(g)
+            original_text, ball_text, combo_text, final_text = self.clear_texts
+            screen.text(35 + shake_x, g.clear_message_y + shake_y, original_text, 13)
             
-            if self.bonus_time > 0:
-                if self.ball_bonus > 0:
-                    ball_text = f"BALL BONUS! -{self.ball_bonus}s ({len(self.balls)} balls)"
-                    pyxel.text(30 + shake_x, self.clear_message_y + 10 + shake_y, ball_text, 10)
+            if g.bonus_time > 0:
+                if g.ball_bonus > 0:
+                    screen.text(30 + shake_x, g.clear_message_y + 10 + shake_y, ball_text, 10)
                 
-                if self.combo_bonus > 0:
-                    combo_text = f"COMBO BONUS! -{self.combo_bonus:.1f}s (Max {self.max_combo} combo)"
-                    pyxel.text(30 + shake_x, self.clear_message_y + 20 + shake_y, combo_text, 11)
+                if g.combo_bonus > 0:
+                    screen.text(30 + shake_x, g.clear_message_y + 20 + shake_y, combo_text, 11)
                 
                 # ボーナス適用後の最終時間を表示（赤色で点滅）
-                final_time = self.clear_time
-                f_minutes = int(final_time // 60)
-                f_seconds = int(final_time % 60)
-                f_milliseconds = int((final_time * 100) % 100)
-                final_text = f"FINAL TIME: {f_minutes:02d}:{f_seconds:02d}.{f_milliseconds:02d}"
-                if pyxel.frame_count % 30 < 20:  # FINISHと同じ点滅タイミング
-                    pyxel.text(35 + shake_x, self.clear_message_y + 30 + shake_y, final_text, 8)  # 8は赤色
+                if self.gfx.frame_count % 30 < 20:  # FINISHと同じ点滅タイミング
+                    screen.text(35 + shake_x, g.clear_message_y + 30 + shake_y, final_text, 8)  # 8は赤色
             
             if TOUCH_CONTROL:
-                pyxel.text(40 + shake_x, self.clear_message_y + 45 + shake_y, "TOUCH TO RESTART", 6)
+                screen.text(40 + shake_x, g.clear_message_y + 45 + shake_y, "TOUCH TO RESTART", 6)
             else:
-                pyxel.text(40 + shake_x, self.clear_message_y + 45 + shake_y, "PRESS SPACE TO RESTART", 6)
+                screen.text(40 + shake_x, g.clear_message_y + 45 + shake_y, "PRESS SPACE TO RESTART", 6)
+            profiler.mark('draw_text')
             return
+        self.clear_texts = None
         
-        if self.game_over:
-            for block in self.blocks:
-                if block['active']:
-                    if block['rotate_speed'] != 0:
+        if g.game_over:
+            blocks = g.blocks
+            for i in range(len(blocks)):
+                if blocks.active[i]:
+                    if blocks.rotate_speed[i] != 0:
                         self.draw_rotated_block(
-                            block['x'] + shake_x,
-                            block['y'] + shake_y,
-                            self.block_width,
-                            self.block_height,
-                            block['color'],
-                            block['rotation']
+                            blocks.x[i] + shake_x,
+                            blocks.y[i] + shake_y,
+                            g.block_width,
+                            g.block_height,
+                            blocks.color[i],
+                            blocks.rotation[i]
                         )
                     else:
-                        pyxel.rect(
-                            block['x'] + shake_x,
-                            block['y'] + shake_y,
-                            self.block_width,
-                            self.block_height,
-                            block['color']
+                        screen.rect(
+                            blocks.x[i] + shake_x,
+                            blocks.y[i] + shake_y,
+                            g.block_width,
+                            g.block_height,
+                            blocks.color[i]
                         )
+            if self.sprite_color is not None:
+                screen.pal()
+                self.sprite_color = None
+            profiler.mark('draw_collapse')
             
-            if self.paddle_opacity > 0:
-                for i, trail_x in enumerate(self.paddle_trail):
-                    alpha = (self.max_paddle_trail - i) / self.max_paddle_trail * self.paddle_opacity
+            if g.paddle_opacity > 0:
+                trail = g.paddle_trail
+                for i in range(len(trail)):
+                    alpha = (g.max_paddle_trail - i) / g.max_paddle_trail * g.paddle_opacity
                     if alpha > 0.3:
-                        color = 1 if i > self.max_paddle_trail // 2 else 5
-                        pyxel.rect(trail_x + shake_x, self.paddle_y + shake_y, 
-                                self.paddle_width, self.paddle_height, color)
+                        color = 1 if i > g.max_paddle_trail // 2 else 5
+                        screen.rect(trail.xs[trail.slot(i)] + shake_x, g.paddle_y + shake_y, 
+                                g.paddle_width, g.paddle_height, color)
                 
-                if self.paddle_opacity > 0.7:
+                if g.paddle_opacity > 0.7:
                     color = 7
-                elif self.paddle_opacity > 0.4:
+                elif g.paddle_opacity > 0.4:
                     color = 6
                 else:
                     color = 5
-                pyxel.rect(self.paddle_x + shake_x, self.paddle_y + shake_y, 
-                          self.paddle_width, self.paddle_height, color)
+                screen.rect(g.paddle_x + shake_x, g.paddle_y + shake_y, 
+                          g.paddle_width, g.paddle_height, color)
             
-            if self.game_over_timer > 30 and (self.game_over_timer // 10) % 2 == 0:
-                pyxel.text(70, 50, "OOPS!", 8)
-                if self.paddle_opacity <= 0:
-                    pyxel.text(40, 70, "PRESS SPACE TO RESTART", 7)
+            if g.game_over_timer > 30 and (g.game_over_timer // 10) % 2 == 0:
+                screen.text(70, 50, "OOPS!", 8)
+                if g.paddle_opacity <= 0:
+                    screen.text(40, 70, "PRESS SPACE TO RESTART", 7)
+            profiler.mark('draw_paddle')
             return
         
-        # パドルの残像を描画
-        for i, trail_x in enumerate(self.paddle_trail):
-            alpha = (self.max_paddle_trail - i) / self.max_paddle_trail
+        # パドルの残像を描画（演出を減らしているときは新しい方から一部だけ）
+        trail = g.paddle_trail
+        trail_count = int(len(trail) * g.effect_scale + 0.5)
+        for i in range(trail_count):
+            alpha = (g.max_paddle_trail - i) / g.max_paddle_trail
             if alpha > 0.7:
                 color = 6
             elif alpha > 0.4:
                 color = 5
             else:
                 color = 1
-            pyxel.rect(trail_x + shake_x, self.paddle_y + shake_y, 
-                      self.paddle_width, self.paddle_height, color)
+            screen.rect(trail.xs[trail.slot(i)] + shake_x, g.paddle_y + shake_y, 
+                      g.paddle_width, g.paddle_height, color)
         
         # 現在のパドルを描画
-        pyxel.rect(self.paddle_x + shake_x, self.paddle_y + shake_y, 
-                  self.paddle_width, self.paddle_height, 7)
-        
-        for ball in self.balls:
-            ball.draw()
-        
-        for block in self.blocks:
-            if block['active']:
-                pyxel.rect(block['x'] + shake_x, block['y'] + shake_y, 
-                          self.block_width, self.block_height, block['color'])
-        
-        for effect in self.explosion_effects:
-            effect.draw()
-        
-        for particle in self.particles:
-            particle.draw()
-        
-        for item in self.items:
-            item.draw()
+        screen.rect(g.paddle_x + shake_x, g.paddle_y + shake_y, 
+                  g.paddle_width, g.paddle_height, 7)
+        profiler.mark('draw_paddle')
         
-        if self.combo_text['timer'] > 0:
-            color = 10 if self.current_combo >= 3 else 7
-            pyxel.text(
-                self.combo_text['x'] + shake_x,
-                self.combo_text['y'] + shake_y,
-                self.combo_text['text'],
+        if g.ball_storm:
+            self.draw_storm(g.balls)
+        else:
+            for ball in g.balls:
+                self.draw_ball(ball)
+        profiler.mark('draw_balls')
+        
+        self.refresh_block_layer()
+        screen.blt(shake_x, shake_y, BLOCK_LAYER_IMAGE, 0, 0, g.width, g.height, 0)
+        profiler.mark('draw_blocks')
+        
+        effects = g.explosion_effects
+        for i in range(effects.count):
+            self.draw_explosion(effects, i)
+        profiler.mark('draw_explode')
+        
+        particles = g.particles
+        for i in range(particles.count):
+            screen.pset(particles.x[i], particles.y[i], particles.color[i])
+        profiler.mark('draw_partic')
+        
+        for item in g.items:
+            self.draw_item(item)
+        profiler.mark('draw_items')
+        
+        if g.combo_text['timer'] > 0:
+            color = 10 if g.current_combo >= 3 else 7
+            screen.text(
+                g.combo_text['x'] + shake_x,
+                g.combo_text['y'] + shake_y,
+                g.combo_text['text'],
                 color
             )
-            self.combo_text['timer'] -= 1
+        profiler.mark('draw_text')
 
-    def update_screen_shake(self):
-        if self.screen_shake['duration'] > 0:
-            magnitude = self.screen_shake['magnitude']
-            if magnitude < 1:
-                shake = 1 if random.random() < magnitude else 0
-            else:
-                shake = random.randint(-int(magnitude), int(magnitude))
-            self.screen_shake['x'] = shake
-            self.screen_shake['y'] = shake
-            self.screen_shake['duration'] -= 1
-        else:
-            self.screen_shake['x'] = 0
-            self.screen_shake['y'] = 0
-            self.screen_shake['magnitude'] = 0
+    def format_clear_texts(self, g):
+        # クリア画面の (元の時間, ボールボーナス, コンボボーナス, 最終時間) の文字列
+        original_time = g.clear_time + g.bonus_time
+        o_minutes = int(original_time // 60)
+        o_seconds = int(original_time % 60)
+        o_milliseconds = int((original_time * 100) % 100)
+        original_text = f"ORIGINAL TIME: {o_minutes:02d}:{o_seconds:02d}.{o_milliseconds:02d}"
+        ball_text = f"BALL BONUS! -{g.ball_bonus}s ({len(g.balls)} balls)"
+        combo_text = f"COMBO BONUS! -{g.combo_bonus:.1f}s (Max {g.max_combo} combo)"
+        final_time = g.clear_time
+        f_minutes = int(final_time // 60)
+        f_seconds = int(final_time % 60)
+        f_milliseconds = int((final_time * 100) % 100)
+        final_text = f"FINAL TIME: {f_minutes:02d}:{f_seconds:02d}.{f_milliseconds:02d}"
+        return original_text, ball_text, combo_text, final_text
 
-    def add_screen_shake(self, combo):
-        if combo >= 2:
-            if combo == 2:
-                magnitude = 0.5
-                duration = 1
-            elif combo == 3:
-                magnitude = 1
-                duration = 3
-            elif combo == 4:
-                magnitude = 2
-                duration = 5
-            else:
-                magnitude = 3
-                duration = 8
-            
-            self.screen_shake['magnitude'] = magnitude
-            self.screen_shake['duration'] = duration
+    def refresh_block_layer(self):
+        g = self.game
+        blocks = g.blocks
+        layer = self.block_layer
+        if layer is None:
+            # pyxel は images[...] のたびに新しいオブジェクトを返すので、1回取ったものを使い続ける
+            layer = self.block_layer = self.gfx.images[BLOCK_LAYER_IMAGE]
+        if self.layer_version != blocks.version or len(self.layer_active) != len(blocks):
+            # 盤面が作り直されたので全部描き直す
+            layer.rect(0, 0, g.width, g.height, 0)
+            for i in range(len(blocks)):
+                if blocks.active[i]:
+                    layer.rect(blocks.x[i], blocks.y[i], g.block_width, g.block_height, blocks.color[i])
+            self.layer_version = blocks.version
+            self.layer_active = bytearray(blocks.active)
+        elif self.layer_active != blocks.active:
+            # 壊れたブロックのセルだけ消す
+            active = blocks.active
+            for i in range(len(active)):
+                if self.layer_active[i] and not active[i]:
+                    layer.rect(blocks.x[i], blocks.y[i], g.block_width, g.block_height, 0)
+            self.layer_active[:] = active
 
-    def start_game_over(self):
-        self.game_over = True
-        self.game_over_timer = 0
-        self.screen_shake['magnitude'] = 3
-        self.screen_shake['duration'] = 8
-        
-        self.paddle_exit_started = True
-        self.paddle_exit_speed = 1
-        
-        for block in self.blocks:
-            if block['active']:
-                block['fall_speed'] = random.uniform(2.0, 4.0)
-                if random.random() < 0.3:
-                    block['rotate_speed'] = random.uniform(-15, 15)
-                block['fall_delay'] = random.randint(0, 20)
-                if random.random() < 0.5:
-                    block['horizontal_speed'] = random.uniform(-1.5, 1.5)
+    def draw_storm(self, balls):
+        # 全ボールをイメージバンクの画素配列に直接書き込み、blt 1回で描く
+        import numpy as np  # ボールストームのときだけ使うので、ここで読み込む
+        screen = self.screen
+        g = self.game
+        if self.storm_pixels is None:
+            image = self.gfx.images[STORM_IMAGE]
+            self.storm_pixels = np.frombuffer(image.data_ptr(), dtype=np.uint8).reshape(image.height, image.width)
+        pixels = self.storm_pixels
+        pixels[:g.height, :g.width] = 0
+        n = balls.count
+        # pyxel.rect と同じく座標は四捨五入する
+        xs = np.floor(balls.x[:n] + 0.5).astype(int)
+        ys = np.floor(balls.y[:n] + 0.5).astype(int)
+        for offset_y in range(balls.size):
+            for offset_x in range(balls.size):
+                px = xs + offset_x
+                py = ys + offset_y
+                visible = (px >= 0) & (px < g.width) & (py >= 0) & (py < g.height)
+                pixels[py[visible], px[visible]] = 7
+        screen.blt(0, 0, STORM_IMAGE, 0, 0, g.width, g.height, 0)
 
-    def update_game_over(self):
-        self.game_over_timer += 1
-        
-        if self.screen_shake['duration'] > 0:
-            magnitude = self.screen_shake['magnitude']
-            self.screen_shake['x'] = random.randint(-magnitude, magnitude)
-            self.screen_shake['y'] = random.randint(-magnitude, magnitude)
-            self.screen_shake['duration'] -= 1
-        else:
-            self.screen_shake['x'] = 0
-            self.screen_shake['y'] = 0
-            self.screen_shake['magnitude'] = 0
-        
-        for block in self.blocks:
-            if block['active']:
-                if block['fall_delay'] > 0:
-                    block['fall_delay'] -= 1
-                    continue
-                
-                block['fall_speed'] += random.uniform(0.5, 0.8)
-                block['rotation'] += block['rotate_speed']
-                block['rotate_speed'] *= 0.995
-                block['x'] += block['horizontal_speed']
-                block['y'] += block['fall_speed']
-                
-                if (block['y'] > pyxel.height or 
-                    block['x'] < -self.block_width * 2 or 
-                    block['x'] > pyxel.width + self.block_width * 2):
-                    block['active'] = False
+    def draw_ball(self, ball):
+        screen = self.screen
+        trail = ball.trail
+        trail_count = len(trail)
+        if self.game.effect_scale < 1:
+            trail_count = int(trail_count * self.game.effect_scale + 0.5)
+        for i in range(1, trail_count):
+            slot = trail.slot(i)
+            color = 1 if i > ball.max_trail // 2 else 5
+            screen.rect(trail.xs[slot], trail.ys[slot], ball.size, ball.size, color)
 
-        if self.paddle_exit_started:
-            self.paddle_exit_speed *= 1.1
-            self.paddle_x += self.paddle_exit_speed
-            self.paddle_opacity = max(0, self.paddle_opacity - 0.05)
+        screen.rect(ball.x, ball.y, ball.size, ball.size, 7)
 
-    def update_paddle(self):
-        last_x = self.paddle_x
-        if TOUCH_CONTROL:
-            if pyxel.btnp(pyxel.MOUSE_BUTTON_LEFT):
-                self.is_touching = True
-            if pyxel.btnr(pyxel.MOUSE_BUTTON_LEFT):
-                self.is_touching = False
-            
-            if self.is_touching:
-                target_x = pyxel.mouse_x - self.paddle_width / 2
-                dx = (target_x - self.paddle_x) * 0.2
-                self.paddle_x = max(0, min(self.paddle_x + dx, pyxel.width - self.paddle_width))
+    def draw_item(self, item):
+        screen = self.screen
+        if self.gfx.frame_count % 30 < 15:
+            color = 11
         else:
-            if pyxel.btn(pyxel.KEY_RIGHT):
-                self.paddle_x = min(self.paddle_x + 4, pyxel.width - self.paddle_width)
-            if pyxel.btn(pyxel.KEY_LEFT):
-                self.paddle_x = max(self.paddle_x - 4, 0)
+            color = 10
+        screen.rect(item.x, item.y, item.size, item.size, color)
 
-        if abs(self.paddle_x - last_x) > 0.5:
-            self.paddle_trail.insert(0, self.paddle_x)
-            if len(self.paddle_trail) > self.max_paddle_trail:
-                self.paddle_trail.pop()
-        elif len(self.paddle_trail) > 0:
-            self.paddle_trail = self.paddle_trail[:-1]
+    def draw_explosion(self, effects, index):
+        screen = self.screen
+        x = effects.x[index]
+        y = effects.y[index]
+        combo = effects.combo[index]
+        radius = effects.get_current_radius(index)
+        num_trails = min(combo * 4 + 8, 32)
+        if self.game.effect_scale < 1:
+            num_trails = max(4, int(num_trails * self.game.effect_scale))
 
-    def check_collisions(self):
-        for ball in self.balls:
-            hit_paddle = False
-            blocks_destroyed = 0
-            destroyed_block_positions = []
-            destroyed_block_colors = []
-            
-            if (ball.y + ball.size > self.paddle_y and 
-                ball.x + ball.size > self.paddle_x and 
-                ball.x < self.paddle_x + self.paddle_width):
-                hit_paddle = True
-                self.current_combo = 0
-                self.combo_timer = 0
-            
-            for i, block in enumerate(self.blocks):
-                if block['active']:
-                    if (ball.x + ball.size > block['x'] and 
-                        ball.x < block['x'] + self.block_width and
-                        ball.y + ball.size > block['y'] and 
-                        ball.y < block['y'] + self.block_height):
-                        
-                        block['active'] = False
-                        ball.dy *= -1
-                        blocks_destroyed += 1
-                        
-                        center_x = block['x'] + self.block_width / 2
-                        center_y = block['y'] + self.block_height / 2
-                        destroyed_block_positions.append((center_x, center_y))
-                        color = 8 + (i // 14) % 7
-                        destroyed_block_colors.append(color)
-                        
-                        if random.random() < 0.08:
-                            self.items.append(Item(
-                                block['x'] + self.block_width/2,
-                                block['y'] + self.block_height/2
-                            ))
-            
-            if blocks_destroyed > 0:
-                # 現在のコンボ数を更新
-                old_combo = self.current_combo
-                self.current_combo += blocks_destroyed
-                
-                # 新しいコンボによるボーナス時間を計算
-                old_bonus = old_combo * 0.1 if old_combo >= 2 else 0
-                new_bonus = self.current_combo * 0.1 if self.current_combo >= 2 else 0
-                combo_bonus = new_bonus - old_bonus  # 増分のみを加算
-                
-                if self.current_combo > self.max_combo:
-                    self.max_combo = self.current_combo
-                self.combo_timer = self.max_combo_timer
-                
-                # コンボボーナスを累積
-                if self.current_combo >= 2:
-                    self.total_combo_bonus += combo_bonus
-                
-                for (pos_x, pos_y), color in zip(destroyed_block_positions, destroyed_block_colors):
-                    self.explosion_effects.append(
-                        ExplosionEffect(pos_x, pos_y, self.current_combo)
-                    )
-                    if self.current_combo >= 2:
-                        if self.current_combo == 2:
-                            num_particles = 6
-                        elif self.current_combo == 3:
-                            num_particles = 10
-                        elif self.current_combo == 4:
-                            num_particles = 15
-                        else:
-                            num_particles = self.current_combo * 4
-                        self.create_particles(pos_x - self.block_width/2, pos_y - self.block_height/2, color, num_particles)
-                
-                if self.current_combo >= 2:
-                    self.combo_text['text'] = f"{self.current_combo} COMBO!"
-                    self.combo_text['x'] = ball.x - 20
-                    self.combo_text['y'] = ball.y - 10
-                    self.combo_text['timer'] = 30
-                    
-                    self.add_screen_shake(self.current_combo)
-            
-            if hit_paddle and blocks_destroyed == 0:
-                self.current_combo = 0
+        color = 10 if combo >= 3 else 6
+        for offset_x, offset_y in ring_offsets(num_trails):
+            screen.pset(x + offset_x * radius, y + offset_y * radius, color)
 
-    def add_new_ball(self):
-        if self.balls:
-            source_ball = random.choice(self.balls)
-            self.balls.append(Ball(source_ball.x, source_ball.y))
+        center_color = 7 if combo < 3 else 10
+        center_size = min(1 + combo // 2, 4)
+        screen.circ(x, y, center_size, center_color)
 
     def draw_rotated_block(self, x, y, width, height, color, angle):
-        center_x = x + width / 2
-        center_y = y + height / 2
-        
-        rad = math.radians(angle)
-        cos_a = math.cos(rad)
-        sin_a = math.sin(rad)
-        
-        corners = [
-            (-width/2, -height/2),
-            (width/2, -height/2),
-            (width/2, height/2),
-            (-width/2, height/2)
-        ]
-        
-        rotated = []
-        for corner_x, corner_y in corners:
-            rx = corner_x * cos_a - corner_y * sin_a + center_x
-            ry = corner_x * sin_a + corner_y * cos_a + center_y
-            rotated.append((rx, ry))
-        
-        pyxel.tri(
-            rotated[0][0], rotated[0][1],
-            rotated[1][0], rotated[1][1],
-            rotated[2][0], rotated[2][1],
-            color
-        )
-        pyxel.tri(
-            rotated[0][0], rotated[0][1],
-            rotated[2][0], rotated[2][1],
-            rotated[3][0], rotated[3][1],
-            color
+        # 角度ごとに描いておいた絵を blt する。色は pal で置き換え、同じ色が続く間はそのまま
+        screen = self.screen
+        sprites = self.block_sprites
+        if sprites is None or sprites[:2] != (width, height):
+            sprites = self.block_sprites = self.build_block_sprites(width, height)
+        _, _, cell, per_row, steps = sprites
+        index = angle_step(angle, steps)
+        if color != self.sprite_color:
+            screen.pal(SPRITE_COLOR, color)
+            self.sprite_color = color
+        screen.blt(
+            x + width / 2 - cell // 2,
+            y + height / 2 - cell // 2,
+            COLLAPSE_IMAGE,
+            index % per_row * cell,
+            index // per_row * cell,
+            cell, cell, 0
         )
 
-    def create_particles(self, x, y, color, num_particles):
-        for _ in range(num_particles):
-            self.particles.append(Particle(
-                x + random.uniform(0, self.block_width),
-                y + random.uniform(0, self.block_height),
-                color
-            ))
+    def build_block_sprites(self, width, height):
+        # 幅 width, 高さ height のブロックを回した絵を cell 四方ずつ並べて描く
+        cell = math.ceil(math.hypot(width, height)) + 2
+        image = self.gfx.images[COLLAPSE_IMAGE]
+        per_row = image.width // cell
+        steps = sprite_steps(cell, image.width)
+        quads = rotated_quad(width, height)
+        image.cls(0)
+        for index in range(steps):
+            center_x = index % per_row * cell + cell // 2
+            center_y = index // per_row * cell + cell // 2
+            x0, y0, x1, y1, x2, y2, x3, y3 = quads[index * ANGLE_STEPS // steps]
+            image.tri(center_x + x0, center_y + y0, center_x + x1, center_y + y1,
+                      center_x + x2, center_y + y2, SPRITE_COLOR)
+            image.tri(center_x + x0, center_y + y0, center_x + x2, center_y + y2,
+                      center_x + x3, center_y + y3, SPRITE_COLOR)
+        return width, height, cell, per_row, steps
+
 
-App() 
\ No newline at end of file
+if __name__ == "__main__":
+    App()
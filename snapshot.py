@@ -0,0 +1,194 @@
+import struct
+import sys
+import time
+from array import array
+
+from game_core import Game, follow_ball_input
+
+# スナップショットの形式（リトルエンディアン、項目の並びは固定）:
+#   ヘッダ    HEADER（フラグ・フレーム数・コンボ・パドル・クリア時間などとボール/アイテム/ブロックの数）
+#   乱数      rng の内部状態 625 個（u32）
+#   ブロック  ブロックごとに生きていれば 1（u8）
+#   ボール    x, y, dx, dy をそれぞれボール数ぶん（f64）
+#   アイテム  x, y をそれぞれアイテム数ぶん（f64）
+#   崩落      ゲームオーバー中だけ: x, y, fall_speed, rotation, rotate_speed, horizontal_speed（f64）と
+#             fall_delay（i32）をそれぞれブロック数ぶん
+# 残しているのはゲームの展開に関わる状態だけ。パーティクル・爆発・残像・画面揺れ・コンボ表示は
+# 戻したときに消える。
+MAGIC = b"BRKS"
+VERSION = 1
+HEADER = struct.Struct("<4sBBIIIIIiIII10d")
+RNG_WORDS = 625
+
+CLEARED = 0x01
+GAME_OVER = 0x02
+PADDLE_EXIT = 0x04
+GAUSS = 0x08
+
+MOTION_FIELDS = ('x', 'y', 'fall_speed', 'rotation', 'rotate_speed', 'horizontal_speed', 'fall_delay')
+
+
+def _column(typecode, values):
+    column = array(typecode, values)
+    if sys.byteorder != 'little':
+        column.byteswap()
+    return column.tobytes()
+
+
+def _read_column(typecode, data, offset, count):
+    column = array(typecode)
+    size = count * column.itemsize
+    column.frombytes(data[offset:offset + size])
+    if sys.byteorder != 'little':
+        column.byteswap()
+    return column, offset + size
+
+
+def snapshot(game):
+    # game の状態を bytes にする
+    version, words, gauss = game.rng.getstate()
+    flags = 0
+    if game.game_cleared:
+        flags |= CLEARED
+    if game.game_over:
+        flags |= GAME_OVER
+    if game.paddle_exit_started:
+        flags |= PADDLE_EXIT
+    if gauss is not None:
+        flags |= GAUSS
+    blocks = game.blocks
+    balls = game.balls
+    if game.ball_storm:
+        n = balls.count
+        ball_data = b''.join(_column('d', getattr(balls, name)[:n].tolist()) for name in ('x', 'y', 'dx', 'dy'))
+    else:
+        n = len(balls)
+        ball_data = (_column('d', [ball.x for ball in balls]) + _column('d', [ball.y for ball in balls]) +
+                     _column('d', [ball.dx for ball in balls]) + _column('d', [ball.dy for ball in balls]))
+    items = game.items
+    parts = [
+        HEADER.pack(
+            MAGIC, VERSION, flags,
+            game.frame_count, game.start_frame, game.game_over_timer,
+            game.current_combo, game.max_combo, game.combo_timer,
+            n, len(items), len(blocks),
+            game.paddle_x, game.paddle_width, game.paddle_exit_speed, game.paddle_opacity,
+            game.clear_time, game.bonus_time, game.ball_bonus, game.combo_bonus, game.total_combo_bonus,
+            gauss or 0.0),
+        _column('I', words),
+        bytes(blocks.active),
+        ball_data,
+        _column('d', [item.x for item in items]),
+        _column('d', [item.y for item in items]),
+    ]
+    if game.game_over:
+        for name in MOTION_FIELDS:
+            parts.append(_column(getattr(blocks, name).typecode, getattr(blocks, name)))
+    return b''.join(parts)
+
+
+def restore(game, data):
+    # snapshot(game) の結果から状態を戻す。盤面（Level）とモードは取ったときと同じであること
+    (magic, version, flags, frame_count, start_frame, game_over_timer,
+     current_combo, max_combo, combo_timer, num_balls, num_items, num_blocks,
+     paddle_x, paddle_width, paddle_exit_speed, paddle_opacity,
+     clear_time, bonus_time, ball_bonus, combo_bonus, total_combo_bonus, gauss) = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not a game snapshot")
+    if num_blocks != len(game.level):
+        raise ValueError("snapshot was taken on a different level")
+    offset = HEADER.size
+    words, offset = _read_column('I', data, offset, RNG_WORDS)
+
+    game.frame_count = frame_count
+    game.start_frame = start_frame
+    game.game_over_timer = game_over_timer
+    game.current_combo = current_combo
+    game.max_combo = max_combo
+    game.combo_timer = combo_timer
+    game.paddle_x = paddle_x
+    game.paddle_width = paddle_width
+    game.paddle_exit_speed = paddle_exit_speed
+    game.paddle_opacity = paddle_opacity
+    game.clear_time = clear_time
+    game.bonus_time = bonus_time
+    game.ball_bonus = ball_bonus
+    game.combo_bonus = combo_bonus
+    game.total_combo_bonus = total_combo_bonus
+    game.game_cleared = bool(flags & CLEARED)
+    game.game_over = bool(flags & GAME_OVER)
+    game.paddle_exit_started = bool(flags & PADDLE_EXIT)
+
+    # 盤面は Level から作り直して生死だけ上書きする。BlockGrid は壊れたブロックを残したままに
+    # するが、当たり判定は必ず active を見るので結果は変わらない
+    blocks = game.blocks
+    blocks.load(game.level)
+    blocks.active[:] = data[offset:offset + num_blocks]
+    blocks.live = blocks.active.count(1)
+    game.block_grid.load(game.level.grid_cells(game.block_grid))
+    offset += num_blocks
+
+    xs, offset = _read_column('d', data, offset, num_balls)
+    ys, offset = _read_column('d', data, offset, num_balls)
+    dxs, offset = _read_column('d', data, offset, num_balls)
+    dys, offset = _read_column('d', data, offset, num_balls)
+    balls = game.balls
+    if game.ball_storm:
+        balls.reserve(num_balls)
+        balls.count = num_balls
+        balls.x[:num_balls] = xs
+        balls.y[:num_balls] = ys
+        balls.dx[:num_balls] = dxs
+        balls.dy[:num_balls] = dys
+    else:
+        # ボールは使い回しで作る（new_ball が引く乱数は最後に状態ごと戻すので関係ない）
+        game.spare_balls.extend(balls)
+        balls.clear()
+        for i in range(num_balls):
+            ball = game.new_ball(xs[i], ys[i])
+            ball.dx = dxs[i]
+            ball.dy = dys[i]
+            balls.append(ball)
+
+    item_xs, offset = _read_column('d', data, offset, num_items)
+    item_ys, offset = _read_column('d', data, offset, num_items)
+    game.spare_items.extend(game.items)
+    game.items.clear()
+    for i in range(num_items):
+        game.items.append(game.new_item(item_xs[i], item_ys[i]))
+
+    if game.game_over:
+        for name in MOTION_FIELDS:
+            field = getattr(blocks, name)
+            values, offset = _read_column(field.typecode, data, offset, num_blocks)
+            field[:] = values
+
+    # 演出は消す
+    game.paddle_trail.clear()
+    game.particles.clear()
+    game.explosion_effects.clear()
+    game.events.clear()
+    for key in game.screen_shake:
+        game.screen_shake[key] = 0
+    game.combo_text['timer'] = 0
+
+    game.rng.setstate((3, tuple(words), gauss if flags & GAUSS else None))
+
+
+if __name__ == "__main__":
+    # スナップショットの大きさと、取る・戻す速さを表示する
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 1500
+    game = Game(seed=0)
+    for _ in range(frames):
+        game.update(follow_ball_input(game))
+    data = snapshot(game)
+    count = 10000
+    start = time.perf_counter()
+    for _ in range(count):
+        snapshot(game)
+    save_time = (time.perf_counter() - start) / count
+    start = time.perf_counter()
+    for _ in range(count):
+        restore(game, data)
+    restore_time = (time.perf_counter() - start) / count
+    print(f"{len(data)} bytes, snapshot {save_time * 1e6:.1f}us, restore {restore_time * 1e6:.1f}us")